@@ -0,0 +1,263 @@
+# coding=utf-8
+# An in-process stand-in for the Firebase REST API, good enough to run firetool against:
+# GET (shallow, orderBy/startAt/endAt/equalTo/limitToFirst/limitToLast), PUT, PATCH (multi-location) and DELETE
+# on /path/.json, with optional latency, injected 504s and connection resets, and a response size limit.
+import json
+import random
+import socket
+import struct
+
+import gevent
+from gevent.pywsgi import WSGIServer, WSGIHandler
+
+try:
+    from urlparse import parse_qs
+except ImportError:
+    from urllib.parse import parse_qs
+
+TOO_LARGE_MESSAGE = 'Data requested exceeds the maximum size that can be accessed with a single request.'
+
+
+class ConnectionReset(Exception):
+    pass
+
+
+def _order_key(value):
+    # Firebase orders null, false, true, numbers, strings, objects
+    if value is None:
+        return 0, 0
+    if value is False:
+        return 1, 0
+    if value is True:
+        return 2, 0
+    if isinstance(value, (int, float)):
+        return 3, value
+    if isinstance(value, str if str is not bytes else basestring):  # noqa: F821
+        return 4, value
+
+    return 5, 0
+
+
+def _key_order(key):
+    try:
+        number = int(key)
+    except ValueError:
+        return 1, 0, key
+
+    if str(number) != key or not -2 ** 31 <= number < 2 ** 31:
+        return 1, 0, key
+
+    return 0, number, ''
+
+
+def _bound(order_by, value, upper):
+    if order_by == '$key':
+        return _key_order(value)
+
+    # startAt/endAt without a key name include every key with that value
+    return _order_key(value), (2, 0, '') if upper else (0, -2 ** 31, '')
+
+
+class FakeFirebase(object):
+    def __init__(self, data=None, latency=0.0, jitter=0.0, error_rate=0.0, reset_rate=0.0, max_response_bytes=None,
+                 indexes=None, seed=None):
+        self.data = data or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.max_response_bytes = max_response_bytes
+        self.indexes = set(indexes or [])
+        self.requests = 0
+        self.methods = {}
+        self._random = random.Random(seed)
+
+    def get_node(self, keys):
+        node = self.data
+
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return None
+
+            node = node[key]
+
+        return node
+
+    def set_node(self, keys, value):
+        if isinstance(value, dict) and not value:
+            value = None
+
+        if not keys:
+            self.data = value if isinstance(value, dict) else {}
+            return
+
+        parents = [self.data]
+        for key in keys[:-1]:
+            child = parents[-1].get(key)
+
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+
+                child = parents[-1][key] = {}
+
+            parents.append(child)
+
+        if value is None:
+            parents[-1].pop(keys[-1], None)
+        else:
+            parents[-1][keys[-1]] = value
+
+        # Like Firebase, objects left without children disappear
+        for parent, key in reversed(list(zip(parents[:-1], keys[:-1]))):
+            if parent[key]:
+                break
+
+            del parent[key]
+
+    def _query(self, node, query):
+        order_by = json.loads(query['orderBy'])
+
+        if order_by == '$key':
+            sort_key = _key_order
+            value_of = lambda key: key
+        else:
+            if order_by != '$value' and order_by not in self.indexes:
+                raise ValueError('Index not defined, add ".indexOn": "%s", for path "/", to the rules' % order_by)
+
+            def value_of(key):
+                value = node[key]
+
+                if order_by != '$value':
+                    for name in order_by.split('/'):
+                        value = value.get(name) if isinstance(value, dict) else None
+
+                return value
+
+            sort_key = lambda key: (_order_key(value_of(key)), _key_order(key))
+
+        keys = sorted(node, key=sort_key)
+
+        if 'equalTo' in query:
+            equal_to = json.loads(query['equalTo'])
+            keys = [key for key in keys if value_of(key) == equal_to]
+
+        if 'startAt' in query:
+            start_at = _bound(order_by, json.loads(query['startAt']), False)
+            keys = [key for key in keys if sort_key(key) >= start_at]
+
+        if 'endAt' in query:
+            end_at = _bound(order_by, json.loads(query['endAt']), True)
+            keys = [key for key in keys if sort_key(key) <= end_at]
+
+        if 'limitToFirst' in query:
+            keys = keys[:int(query['limitToFirst'])]
+
+        if 'limitToLast' in query:
+            keys = keys[-int(query['limitToLast']):]
+
+        return dict((key, node[key]) for key in keys)
+
+    def _get(self, keys, query):
+        node = self.get_node(keys)
+
+        if 'orderBy' in query and isinstance(node, dict):
+            node = self._query(node, query)
+        elif query.get('shallow') == 'true' and isinstance(node, dict):
+            node = dict((key, True) for key in node)
+
+        return node
+
+    def _patch(self, keys, value):
+        paths = sorted([key for key in name.split('/') if key] for name in value)
+
+        for previous, current in zip(paths, paths[1:]):
+            if current[:len(previous)] == previous:
+                raise ValueError('Invalid data; paths overlap: %s and %s' % ('/'.join(previous), '/'.join(current)))
+
+        for name, child in value.items():
+            self.set_node(keys + [key for key in name.split('/') if key], child)
+
+        return value
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+        query = dict((name, values[0]) for name, values in parse_qs(environ.get('QUERY_STRING', '')).items())
+
+        self.requests += 1
+        self.methods[method] = self.methods.get(method, 0) + 1
+
+        if self.latency or self.jitter:
+            gevent.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        if self.reset_rate and self._random.random() < self.reset_rate:
+            raise ConnectionReset()
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self._respond(start_response, '504 Gateway Timeout', {'error': 'Timed out'})
+
+        if not path.endswith('.json'):
+            return self._respond(start_response, '404 Not Found', {'error': 'Not found'})
+
+        keys = [key for key in path[:-len('.json')].split('/') if key]
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+
+        try:
+            if method == 'GET':
+                result = self._get(keys, query)
+            elif method == 'PUT':
+                result = json.loads(body.decode('utf8'))
+                self.set_node(keys, result)
+            elif method == 'PATCH':
+                result = self._patch(keys, json.loads(body.decode('utf8')))
+            elif method == 'DELETE':
+                result = None
+                self.set_node(keys, None)
+            else:
+                return self._respond(start_response, '405 Method Not Allowed', {'error': 'Method not allowed'})
+        except ValueError as ex:
+            return self._respond(start_response, '400 Bad Request', {'error': str(ex)})
+
+        return self._respond(start_response, '200 OK', result)
+
+    def _respond(self, start_response, status, result):
+        content = json.dumps(result).encode('utf8')
+
+        if status == '200 OK' and self.max_response_bytes and len(content) > self.max_response_bytes:
+            status = '400 Bad Request'
+            content = json.dumps({'error': TOO_LARGE_MESSAGE}).encode('utf8')
+
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(content)))])
+
+        return [content]
+
+
+class _Handler(WSGIHandler):
+    def run_application(self):
+        try:
+            WSGIHandler.run_application(self)
+        except ConnectionReset:
+            # SO_LINGER 0 makes close send a RST, the client sees "connection reset by peer"
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.socket.close()
+            self.close_connection = True
+            self.response_length = 0
+            self.status = '000 Reset'
+
+
+class _Server(WSGIServer):
+    handler_class = _Handler
+
+    def handle(self, sock, address):
+        # Without it small responses wait for delayed ACKs
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return WSGIServer.handle(self, sock, address)
+
+
+def serve(fake, host='127.0.0.1', port=0):
+    server = _Server((host, port), fake, log=None, error_log=None)
+    server.start()
+
+    return server, 'http://%s:%d/' % (host, server.server_port)
@@ -0,0 +1,114 @@
+# coding=utf-8
+# Compares the completion-queue return_final_result with the previous implementation that
+# rescanned every outstanding future after each wakeup.
+#
+#   python benchmarks/return_final_result.py --sizes 10000,100000,1000000
+import os
+import sys
+import time
+import types
+
+import click
+import gevent
+from gevent import monkey
+from gevent.event import Event
+
+monkey.patch_all()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firetool_commands.common import return_final_result  # noqa: E402
+
+
+def legacy_return_final_result(method):
+    new_futures = []
+
+    for future_or_string in method():
+        if future_or_string is None:
+            continue
+
+        if isinstance(future_or_string, tuple):
+            yield future_or_string
+            continue
+
+        new_futures.append(future_or_string)
+
+    while len(new_futures) > 0:
+        gevent.wait(new_futures, count=1)
+        ready_indexes = [i for i, ff in enumerate(new_futures) if ff.ready()]
+        for i in ready_indexes:
+            f = new_futures[i]
+            new_futures[i] = None
+
+            if f.value is None:
+                continue
+
+            if isinstance(f.value, gevent.Greenlet):
+                new_futures.append(f.value)
+                continue
+
+            if not isinstance(f.value, types.GeneratorType):
+                yield f.value
+                continue
+
+            for future_or_string in f.value:
+                if isinstance(future_or_string, tuple):
+                    yield future_or_string
+                    continue
+                elif isinstance(future_or_string, gevent.Greenlet):
+                    new_futures.append(future_or_string)
+
+        new_futures = [ff for ff in new_futures if ff is not None]
+
+
+def finish_after(i, event):
+    event.wait()
+
+    return i, None
+
+
+def release(events):
+    # Let the futures complete in `slots` waves, like responses arriving over time
+    for event in events:
+        event.set()
+        gevent.sleep(0)
+
+
+def run(implementation, size, slots):
+    def method():
+        events = [Event() for _ in range(slots)]
+
+        for i in range(size):
+            yield gevent.spawn(finish_after, i, events[i % slots])
+
+        gevent.spawn(release, events)
+
+    start = time.time()
+    total = sum(1 for _ in implementation(method))
+    elapsed = time.time() - start
+
+    assert total == size
+
+    return elapsed
+
+
+@click.command()
+@click.option('--sizes', default='10000,100000,1000000')
+@click.option('--slots', type=int, default=1000)
+@click.option('--legacy-max', type=int, default=100000)
+def main(sizes, slots, legacy_max):
+    for size in [int(s) for s in sizes.split(',')]:
+        elapsed = run(return_final_result, size, slots)
+        line = '%9d futures  queue: %8.2fs' % (size, elapsed)
+
+        if size <= legacy_max:
+            legacy_elapsed = run(legacy_return_final_result, size, slots)
+            line += '  rescan: %8.2fs  (x%.1f)' % (legacy_elapsed, legacy_elapsed / elapsed)
+        else:
+            line += '  rescan: skipped (--legacy-max %s)' % legacy_max
+
+        click.echo(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# coding=utf-8
+# Runs list, count, copy and delete end to end against the in-process Firebase stand-in in fake_firebase.py
+# and reports the time, requests/sec and peak RSS of every step.
+#
+#   python benchmarks/suite.py --sizes 10000,100000,1000000 --latency 0.02 --concurrency 100
+#
+# The fake runs in the same process, peak RSS includes the synthetic tree it holds.
+# Every step checks its results and what the fake holds afterwards, a wrong result fails the run.
+import os
+import sys
+import time
+
+import click
+from gevent import monkey
+
+monkey.patch_all()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_firebase import FakeFirebase, serve  # noqa: E402
+from firetool_commands.common import PlainFirebaseRoot, RetryPolicy  # noqa: E402
+from firetool_commands.operations import list_values, count_values, copy_values, delete_values  # noqa: E402
+from firetool_commands.stats import format_bytes, format_seconds  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss():
+    if resource is None:
+        return None
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def build_tree(size):
+    return dict(('node%07d' % i, {'name': 'node %d' % i, 'value': i, 'tags': {'even': i % 2 == 0}})
+                for i in range(size))
+
+
+def run_step(fake, name, size, operation, check):
+    requests_before = fake.requests
+    start = time.time()
+
+    results = 0
+    last = None
+    for last in operation():
+        results += 1
+
+    elapsed = max(time.time() - start, 0.001)
+    requests = fake.requests - requests_before
+    rss = peak_rss()
+
+    click.echo('%8d %-7s %8d results %8d requests in %7s, %8.1f requests/s, %8.1f nodes/s, peak RSS %s' % (
+        size, name, results, requests, format_seconds(elapsed), requests / elapsed, size / elapsed,
+        format_bytes(rss) if rss is not None else '-'))
+
+    error = check(results, last)
+    if error:
+        raise click.ClickException('%d %s: %s' % (size, name, error))
+
+
+def checks(fake, size):
+    """Returns, per step, check(results, last result) -> what is wrong or None."""
+    def check_list(results, last):
+        if results != size:
+            return 'listed %d nodes' % results
+
+    def check_count(results, last):
+        # Every node has 3 children
+        if last != ('bench', [size, 3 * size]):
+            return 'counted %r' % (last,)
+
+    def check_copy(results, last):
+        if fake.data.get('copy') != fake.data['bench']:
+            return 'the copy differs from the source'
+
+    def check_delete(results, last):
+        if 'copy' in fake.data:
+            return '%d copied nodes were not deleted' % len(fake.data['copy'])
+
+    return {'list': check_list, 'count': check_count, 'copy': check_copy, 'delete': check_delete}
+
+
+@click.command()
+@click.option('--sizes', default='10000,100000', help='comma separated number of nodes in the synthetic tree')
+@click.option('--latency', type=float, default=0.0, help='seconds the fake waits before every response')
+@click.option('--jitter', type=float, default=0.0, help='up to that many extra seconds per response')
+@click.option('--error-rate', type=float, default=0.0, help='fraction of requests failing with 504')
+@click.option('--reset-rate', type=float, default=0.0, help='fraction of connections reset by the fake')
+@click.option('--max-response-bytes', type=int, help='larger responses fail like Firebase does for huge nodes')
+@click.option('--concurrency', type=int, default=100)
+@click.option('--batch-size', type=int, default=500, help='copy and delete batch size')
+@click.option('--steps', default='list,count,copy,delete')
+def main(sizes, latency, jitter, error_rate, reset_rate, max_response_bytes, concurrency, batch_size, steps):
+    steps = steps.split(',')
+
+    for size in [int(size) for size in sizes.split(',')]:
+        fake = FakeFirebase(
+            {'bench': build_tree(size)}, latency=latency, jitter=jitter, error_rate=error_rate,
+            reset_rate=reset_rate, max_response_bytes=max_response_bytes, seed=size)
+        server, url = serve(fake)
+
+        try:
+            root = PlainFirebaseRoot(url, pool_size=concurrency, retry_policy=RetryPolicy(budget=size))
+
+            operations = [
+                ('list', lambda: list_values(root, 'bench/(.*)')),
+                ('count', lambda: count_values(root, 'bench', depth=2)),
+                ('copy', lambda: copy_values(root, 'bench/(.*)', r'copy/\1', batch_size=batch_size)),
+                ('delete', lambda: delete_values(root, 'copy/(.*)', batch_size=batch_size)),
+            ]
+
+            step_checks = checks(fake, size)
+
+            for name, operation in operations:
+                if name in steps:
+                    run_step(fake, name, size, operation, step_checks[name])
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,53 @@
 #!/usr/bin/env python
 # coding=utf-8
 import click
+import gevent
 from gevent import monkey
-from firetool_commands import delete_command, copy_command, list_command, count_command
+from firetool_commands import delete_command, copy_command, list_command, count_command, export_command, \
+    import_command, sync_command, watch_command
+from firetool_commands.auth import print_connection_stats, print_retry_stats, print_run_stats, collect_metrics
+from firetool_commands.common import save_json_file
+from firetool_commands.stats import dump_metrics_periodically
 
 monkey.patch_all()
 
 
-# noinspection PyUnusedLocal
 @click.group()
-def cli(**kwargs):
-    pass
+@click.option('--pool-stats/--no-pool-stats', default=False)
+@click.option('--stats/--no-stats', default=False)
+@click.option('--metrics-file', required=False)
+@click.option('--metrics-interval', type=float, default=10.0)
+@click.pass_context
+def cli(ctx, pool_stats, stats, metrics_file, metrics_interval):
+    ctx.call_on_close(print_retry_stats)
+
+    if pool_stats:
+        ctx.call_on_close(print_connection_stats)
+
+    if stats:
+        ctx.call_on_close(print_run_stats)
+
+    if metrics_file:
+        def write_metrics(metrics):
+            save_json_file(metrics_file, metrics)
+
+        dumper = gevent.spawn(dump_metrics_periodically, collect_metrics, write_metrics, metrics_interval)
+
+        def write_final_metrics():
+            dumper.kill()
+            write_metrics(collect_metrics())
+
+        ctx.call_on_close(write_final_metrics)
 
 
 cli.add_command(delete_command)
 cli.add_command(copy_command)
 cli.add_command(list_command)
 cli.add_command(count_command)
+cli.add_command(export_command)
+cli.add_command(import_command)
+cli.add_command(sync_command)
+cli.add_command(watch_command)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
 # coding=utf-8
 
-from .operations import delete_command, copy_command, list_command, count_command
+from .operations import delete_command, copy_command, list_command, count_command, export_command, import_command, \
+    sync_command, watch_command
@@ -1,9 +1,14 @@
 # coding=utf-8
 import os
 
+import click
 import datetime
 from oauth2client.client import OAuth2Credentials
+from firetool_commands.cache import DiskCache, DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_BYTES
 from firetool_commands.common import PlainFirebaseRoot
+from firetool_commands.concurrency import DEFAULT_CONCURRENCY
+from firetool_commands.retry import RetryPolicy
+from firetool_commands.stats import format_stats
 from firetool_commands.configstore import Configstore
 
 client_id = os.environ.get(
@@ -13,6 +18,8 @@ client_secret = os.environ.get('FIREBASE_CLIENT_SECRET', 'j9iVZfS8kkCEFUPaAeJV0s
 google_origin = os.environ.get(
     'FIREBASE_TOKEN_URL', os.environ.get('FIREBASE_GOOGLE_URL', 'https://www.googleapis.com'))
 
+firebase_roots = []
+
 
 def get_cred():
     config_store = Configstore('firebase-tools')
@@ -25,9 +32,55 @@ def get_cred():
         user_agent='firetool')
 
 
-def get_firebase(project):
+def get_firebase(project, concurrency=DEFAULT_CONCURRENCY, adaptive=False, retry_attempts=8, retry_budget=1000,
+                 cache=False, cache_ttl=DEFAULT_CACHE_TTL, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, clear_cache=False):
     c = get_cred()
-    firebase = PlainFirebaseRoot('https://{project}.firebaseio.com/'.format(project=project))
+    url = 'https://{project}.firebaseio.com/'.format(project=project)
+
+    if clear_cache:
+        DiskCache(url, ttl=cache_ttl, max_bytes=cache_max_bytes).clear()
+    firebase = PlainFirebaseRoot(
+        url, pool_size=concurrency, adaptive=adaptive,
+        retry_policy=RetryPolicy(max_attempts=retry_attempts, budget=retry_budget),
+        cache=DiskCache(url, ttl=cache_ttl, max_bytes=cache_max_bytes) if cache else None)
     firebase.set_credentials(c)
+    firebase_roots.append(firebase)
 
     return firebase
+
+
+def print_connection_stats():
+    for firebase in firebase_roots:
+        stats = firebase.connection_stats()
+        click.echo('%s requests: %s reused connections: %s new connections: %s' % (
+            firebase.firebase_root(), stats['requests'], stats['hits'], stats['misses']), err=True)
+
+        if firebase.cache is not None:
+            click.echo('%s cache hits: %s misses: %s' % (
+                firebase.firebase_root(), firebase.cache.hits, firebase.cache.misses), err=True)
+
+        if 'limit' in stats:
+            click.echo('%s adaptive concurrency: %s (decreased %s times)' % (
+                firebase.firebase_root(), stats['limit'], stats['limit_decreases']), err=True)
+
+
+def print_retry_stats():
+    for firebase in firebase_roots:
+        policy = firebase.retry_policy
+
+        if policy.retries == 0:
+            continue
+
+        click.echo('%s retries: %s backing off: %.1fs circuit breaker opened: %s times' % (
+            firebase.firebase_root(), policy.retries, policy.backoff_time, policy.breaker_trips), err=True)
+
+
+def print_run_stats():
+    for firebase in firebase_roots:
+        for line in format_stats(firebase.stats):
+            click.echo('%s %s' % (firebase.firebase_root(), line), err=True)
+
+
+def collect_metrics():
+    return dict(
+        (firebase.firebase_root(), firebase.stats.to_dict(firebase.retry_policy)) for firebase in firebase_roots)
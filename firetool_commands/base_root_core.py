@@ -2,6 +2,7 @@
 import json
 import logging
 import math
+import time
 
 try:
     import httplib
@@ -10,8 +11,17 @@ except ImportError:
 
 try:
     from urlparse import urljoin
+    from urllib import urlencode
 except ImportError:
-    from urllib.parse import urljoin
+    from urllib.parse import urljoin, urlencode
+
+from firetool_commands.retry import RetryPolicy, RETRY_STATUSES
+from firetool_commands.stats import RunStats
+
+QUERY_PARAMETERS = ('orderBy', 'equalTo', 'startAt', 'endAt', 'limitToFirst', 'limitToLast')
+
+# They change how a GET is retried and logged, not what it returns
+REQUEST_OPTIONS = ('retry_statuses', 'handled_statuses')
 
 
 def _json_handler(obj):
@@ -28,11 +38,16 @@ def _json_handler(obj):
 
 
 class FirebaseRootCore(object):
-    gets = 0
+    # Exceptions the http object raises when a response takes too long
+    timeout_errors = ()
 
-    def __init__(self, firebase_root):
+    def __init__(self, firebase_root, retry_policy=None, cache=None):
         self._http = None
         self._firebase_root = firebase_root
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.stats = RunStats()
+        self._credentials = None
 
     def get_http(self):
         return None
@@ -46,8 +61,16 @@ class FirebaseRootCore(object):
         return self._http
 
     def set_credentials(self, credentials):
+        self._credentials = credentials
         self._http = credentials.authorize(self.http)
 
+    def stream_headers(self):
+        # Event streams are read outside of the authorized http. The token goes in a header, a URL ends up in logs
+        if self._credentials is None:
+            return {}
+
+        return {'Authorization': 'Bearer %s' % self._credentials.get_access_token().access_token}
+
     @classmethod
     def common_path(cls, a, b):
         a_elements = a.split('/')
@@ -64,7 +87,7 @@ class FirebaseRootCore(object):
 
     @classmethod
     def subtract_path(cls, common_path, path):
-        p = path.replace(common_path, '')
+        p = path[len(common_path):] if path.startswith(common_path) else path
 
         if p.startswith('/'):
             p = p[1:]
@@ -83,12 +106,22 @@ class FirebaseRootCore(object):
         if method == 'NOPE':
             return {}
 
-        res, content = self.http.request(url, method=method, body=body, headers=headers)
+        start_time = time.time()
+        bytes_out = len(body) if body else 0
+
+        try:
+            res, content = self.http.request(url, method=method, body=body, headers=headers)
+        except Exception as ex:
+            self.stats.record(method, time.time() - start_time, bytes_out=bytes_out, error=type(ex).__name__)
+            raise
+
+        self.stats.record(
+            method, time.time() - start_time, bytes_out=bytes_out, bytes_in=len(content), status=res.status)
         self.validate_http_response(res, content)
 
         return json.loads(content.decode('utf8'))
 
-    def _json_method_url(self, method, path, params):
+    def _json_method_url(self, method, path, params, retry_statuses=RETRY_STATUSES, handled_statuses=()):
         url = self.build_url(path)
 
         body = None
@@ -98,27 +131,62 @@ class FirebaseRootCore(object):
             json_str = json.dumps(params, default=_json_handler)
             body = json_str
             headers = {"Content-Type": "application/json"}
-        elif 'shallow' in params:
-            shallow = params.get('shallow')
-            del params['shallow']
+        else:
+            retry_statuses = params.pop('retry_statuses', retry_statuses)
+            handled_statuses = params.pop('handled_statuses', handled_statuses)
+            query = []
+
+            if params.pop('shallow', False):
+                query.append(('shallow', 'true'))
+
+            for name in QUERY_PARAMETERS:
+                if name in params:
+                    query.append((name, json.dumps(params.pop(name))))
 
-            if shallow:
-                url += '?shallow=true'
+            if query:
+                url += '?' + urlencode(query)
 
+        if method not in ('GET', 'NOPE') and self.cache is not None:
+            # Anything cached may be stale from now on, drop it and stop caching for the rest of the run
+            logging.info('%s: writing, clearing the cache', self._firebase_root)
+            self.cache.clear()
+            self.cache = None
+
+        attempt = 0
         while True:
+            attempt += 1
+            self.retry_policy.wait_if_open()
+
             try:
                 r = self.on_request(url, method, body, headers)
+                self.retry_policy.record_success()
                 break
             except httplib.HTTPException as ex:
                 content, r = ex.args
 
-                if r.status == 504:
-                    print('%s, retrying' % (content, ))
+                if r.status in retry_statuses and self.retry_policy.should_retry(attempt):
+                    logging.info('%s %s: %s, retrying', method, url, r.status)
+                    self.retry_policy.backoff(attempt)
                     continue
 
+                if r.status in handled_statuses:
+                    logging.info('%s %s: %s', method, url, r.status)
+                    raise
+
                 logging.error("request failed %d %s", r.status, content)
                 logging.error("The following request failed: (%s) %s\nbody: %s\nheaders: %s", method, url, body, headers)
                 raise
+            except self.timeout_errors:
+                # A read timeout is the client side of a 504
+                if 504 in retry_statuses and self.retry_policy.should_retry(attempt):
+                    logging.info('%s %s: timed out, retrying', method, url)
+                    self.retry_policy.backoff(attempt)
+                    continue
+
+                if 504 not in handled_statuses:
+                    logging.error("The following request timed out: (%s) %s", method, url)
+
+                raise
 
         return r
 
@@ -130,10 +198,29 @@ class FirebaseRootCore(object):
             url = self.build_path(*args[:-1]) if len(args) > 1 else self.build_path(*args)
             return self._json_method_url(method, url, args[-1])
 
-    def get(self, *args, **kwargs):
-        post_process = kwargs.get('post_process')
+    def _cached_get(self, cache, *args, **kwargs):
+        key = cache.key(self.build_path(*args), dict(
+            (name, value) for name, value in kwargs.items() if name not in REQUEST_OPTIONS))
+        found, result = cache.get(key)
+
+        if found:
+            return result
+
         result = self.json_method("GET", *args, **kwargs)
 
+        if self.cache is cache:
+            cache.set(key, result)
+
+        return result
+
+    def get(self, *args, **kwargs):
+        post_process = kwargs.pop('post_process', None)
+
+        if self.cache is not None:
+            result = self._cached_get(self.cache, *args, **kwargs)
+        else:
+            result = self.json_method("GET", *args, **kwargs)
+
         if post_process is None:
             return result
 
@@ -148,8 +235,8 @@ class FirebaseRootCore(object):
     def nope(self, *args, **kwargs):
         return self.json_method("NOPE", *args, **kwargs)
 
-    def multi_patch(self, url, params):
-        return self._json_method_url("PATCH", url, params)
+    def multi_patch(self, url, params, **kwargs):
+        return self._json_method_url("PATCH", url, params, **kwargs)
 
     def patch(self, *args, **kwargs):
         return self.json_method("PATCH", *args, **kwargs)
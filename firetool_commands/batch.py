@@ -0,0 +1,180 @@
+# coding=utf-8
+import json
+from collections import deque, OrderedDict
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from firetool_commands.base_root_core import FirebaseRootCore, _json_handler
+from firetool_commands.retry import RETRY_STATUSES
+
+DEFAULT_MAX_BATCH_BYTES = 10 * 1024 * 1024
+
+
+def path_ancestors(path):
+    elements = path.split('/')
+
+    for i in range(1, len(elements)):
+        yield '/'.join(elements[:i])
+
+
+def parent_path(path):
+    if '/' not in path:
+        return ''
+
+    return path.rsplit('/', 1)[0]
+
+
+class MultiPatchBatch(object):
+    def __init__(self):
+        self.items = OrderedDict()
+        self.tags = []
+        self.size = 0
+        self.__ancestors = set()
+        self.attempts = 0
+        self.common = None
+        self.result = None
+        self.exception = None
+
+    def __len__(self):
+        return len(self.tags)
+
+    def overlaps(self, path):
+        if path in self.items or path in self.__ancestors:
+            return True
+
+        for ancestor in path_ancestors(path):
+            if ancestor in self.items:
+                return True
+
+        return False
+
+    def add(self, path, value, size, tag=None):
+        if path not in self.items:
+            self.size += size
+            self.__ancestors.update(path_ancestors(path))
+
+        self.items[path] = value
+        self.tags.append((tag, path, value))
+
+    def common_root(self):
+        common = None
+        for path in self.items.keys():
+            common = path if common is None else FirebaseRootCore.common_path(common, path)
+
+        if common in self.items:
+            common = parent_path(common)
+
+        return common or ''
+
+    def to_patch(self):
+        self.common = self.common_root()
+
+        return self.common, FirebaseRootCore.subtract_paths(self.items, self.common)
+
+
+class MultiPatchWriter(object):
+    def __init__(self, firebase_root, max_items=500, max_bytes=DEFAULT_MAX_BATCH_BYTES, dry=False, max_pending=4,
+                 retries=None):
+        self._firebase_root = firebase_root
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._dry = dry
+        self._max_pending = max_pending
+        self._retries = retries
+        self._batch = MultiPatchBatch()
+        self._pending = deque()
+
+    def __overlaps(self, path):
+        if self._batch.overlaps(path):
+            return True
+
+        for batch, _ in self._pending:
+            if batch.overlaps(path):
+                return True
+
+        return False
+
+    def add(self, path, value, tag=None):
+        path = path.strip('/')
+        size = len(path) + len(json.dumps(value, default=_json_handler))
+
+        finished = []
+        if self.__overlaps(path):
+            self._send()
+            finished.extend(self._collect(block=True))
+        elif len(self._batch) > 0 and self._batch.size + size > self._max_bytes:
+            self._send()
+
+        self._batch.add(path, value, size, tag)
+
+        if len(self._batch) >= self._max_items or self._batch.size >= self._max_bytes:
+            self._send()
+
+        finished.extend(self._collect(block=False))
+
+        return finished
+
+    def flush(self):
+        self._send()
+
+        return self._collect(block=True)
+
+    def _should_retry(self, batch, ex):
+        # Anything but an overload or a timeout, a rejected write, fails the same way every time
+        if isinstance(ex, httplib.HTTPException) and ex.args[1].status not in RETRY_STATUSES:
+            return False
+
+        if self._retries is not None and batch.attempts > self._retries:
+            return False
+
+        return self._firebase_root.retry_policy.should_retry(batch.attempts)
+
+    def _patch(self, batch):
+        common, data = batch.to_patch()
+
+        if self._dry:
+            return None
+
+        retryable = (httplib.HTTPException, ) + self._firebase_root.timeout_errors
+
+        while True:
+            batch.attempts += 1
+
+            # The batch is the only retry layer, every attempt is one request
+            try:
+                return self._firebase_root.multi_patch(
+                    common, data, retry_statuses=(), handled_statuses=RETRY_STATUSES)
+            except retryable as ex:
+                if not self._should_retry(batch, ex):
+                    raise
+
+            self._firebase_root.retry_policy.backoff(batch.attempts)
+
+    def _send(self):
+        if len(self._batch) == 0:
+            return
+
+        batch = self._batch
+        self._batch = MultiPatchBatch()
+        self._pending.append((batch, self._firebase_root.spawn(self._patch, batch)))
+
+    def _collect(self, block):
+        finished = []
+
+        while self._pending:
+            batch, future = self._pending[0]
+
+            if not future.ready() and not block and len(self._pending) <= self._max_pending:
+                break
+
+            future.join()
+            self._pending.popleft()
+
+            batch.result = future.value
+            batch.exception = future.exception
+            finished.append(batch)
+
+        return finished
@@ -0,0 +1,121 @@
+# coding=utf-8
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from firetool_commands.configstore import XdgBadeDir
+
+DEFAULT_CACHE_TTL = 60 * 60
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def _hash(value):
+    return hashlib.sha1(value.encode('utf8')).hexdigest()
+
+
+class DiskCache(object):
+    """GET results of one database, one file per request, expired after ttl and evicted least recently used first."""
+
+    cache_dir = os.path.join(XdgBadeDir.cache or tempfile.gettempdir(), 'firetool')
+
+    def __init__(self, firebase_root, ttl=DEFAULT_CACHE_TTL, max_bytes=DEFAULT_CACHE_MAX_BYTES, cache_dir=None):
+        self.directory = os.path.join(cache_dir or self.cache_dir, _hash(firebase_root)[:16])
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+
+    @classmethod
+    def key(cls, path, params):
+        return json.dumps([path, sorted(params.items())], sort_keys=True)
+
+    def _filename(self, key):
+        digest = _hash(key)
+
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    def get(self, key):
+        filename = self._filename(key)
+
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return False, None
+
+        if entry.get('key') != key or time.time() - entry['created'] > self.ttl:
+            self.misses += 1
+            return False, None
+
+        # mtime is the last use, that is what eviction goes by
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+        self.hits += 1
+
+        return True, entry['value']
+
+    def set(self, key, value):
+        filename = self._filename(key)
+        data = json.dumps({'key': key, 'created': time.time(), 'value': value})
+
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+        temp_filename = '%s.%s.tmp' % (filename, os.getpid())
+        with open(temp_filename, 'w') as f:
+            f.write(data)
+
+        os.rename(temp_filename, filename)
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._total_bytes += len(data)
+
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                filename = os.path.join(root, name)
+
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+
+                yield filename, stat.st_size, stat.st_mtime
+
+    def evict(self, target_ratio=0.9):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for filename, size, _ in entries:
+            if total_bytes <= self.max_bytes * target_ratio:
+                break
+
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+
+            total_bytes -= size
+
+        self._total_bytes = total_bytes
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._total_bytes = 0
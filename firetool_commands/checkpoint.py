@@ -0,0 +1,65 @@
+# coding=utf-8
+import hashlib
+import json
+import re
+
+from firetool_commands.common import get_elements, is_wildcard_element, natural_key, load_json_file, save_json_file, \
+    match_keys
+
+DEFAULT_CHECKPOINT_EVERY = 100
+
+
+def list_branch_keys(firebase_root, path, descending_order=False):
+    elements = get_elements(path)
+
+    if len(elements) < 2 or not is_wildcard_element(elements[1]):
+        raise ValueError('%s: --checkpoint needs a path whose first special element is a (wildcard)' % path)
+
+    children = firebase_root.get(elements[0], shallow=True)
+
+    if not isinstance(children, dict):
+        return []
+
+    keys = [key for key, _ in match_keys(re.compile(elements[1]), children)]
+
+    return sorted(keys, reverse=descending_order, key=natural_key)
+
+
+class Checkpoint(object):
+    """Records, per path, the first wildcard keys in iteration order and how many of them were completed."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._state = load_json_file(filename) or {}
+
+    def _keys_filename(self, path):
+        return '%s.%s.keys' % (self._filename, hashlib.md5(path.encode('utf8')).hexdigest()[:8])
+
+    def _load_keys(self, firebase_root, path, descending_order):
+        if path in self._state:
+            with open(self._keys_filename(path)) as f:
+                return json.load(f)
+
+        keys = list_branch_keys(firebase_root, path, descending_order)
+
+        # The key list is written once, only the small state file is rewritten after every window
+        save_json_file(self._keys_filename(path), keys)
+        self._state[path] = {'completed': 0, 'total': len(keys)}
+        save_json_file(self._filename, self._state)
+
+        return keys
+
+    def completed(self, path):
+        return self._state.get(path, {}).get('completed', 0)
+
+    def windows(self, firebase_root, path, size=DEFAULT_CHECKPOINT_EVERY, descending_order=False):
+        keys = self._load_keys(firebase_root, path, descending_order)
+
+        while self._state[path]['completed'] < len(keys):
+            completed = self._state[path]['completed']
+            window = keys[completed:completed + size]
+
+            yield window
+
+            self._state[path]['completed'] = completed + len(window)
+            save_json_file(self._filename, self._state)
@@ -1,15 +1,69 @@
 # coding=utf-8
+import json
+import logging
+import os
 import sys
 import time
 import datetime
 import types
+from collections import deque
 from contextlib import closing
 import gevent
 import re
 import requests
 from gevent.pool import Pool
+from gevent.queue import Queue
+from requests.adapters import HTTPAdapter
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
 from firetool_commands.base_root_core import FirebaseRootCore
+from firetool_commands.concurrency import AdaptiveLimiter, DEFAULT_CONCURRENCY, OVERLOAD_STATUSES
+from firetool_commands.jsonstream import iterate_json_object
+from firetool_commands.predicate import compile_predicate
+from firetool_commands.retry import RetryPolicy, RETRY_STATUSES
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# get_tree retries 504s and timeouts itself, SPLIT_ATTEMPTS times before splitting the node
+SPLIT_RETRY_STATUSES = tuple(status for status in RETRY_STATUSES if status != 504)
+SPLIT_HANDLED_STATUSES = (400, 413, 504)
+SPLIT_ATTEMPTS = 2
+
+
+def is_timeout_error(ex):
+    if isinstance(ex, requests.exceptions.ReadTimeout):
+        return True
+
+    return ex.args[1].status == 504
+
+
+def is_oversized_error(ex):
+    if is_timeout_error(ex):
+        return True
+
+    content, r = ex.args
+
+    if r.status == 413:
+        return True
+
+    if r.status != 400:
+        return False
+
+    if not isinstance(content, bytes):
+        content = content.encode('utf8')
+
+    content = content.lower()
+
+    return b'exceeds the maximum size' in content or b'too large' in content
 
 
 def fill_wildcards(p, groups, values=None):
@@ -28,6 +82,24 @@ def fill_wildcards(p, groups, values=None):
     return p
 
 
+def load_json_file(filename):
+    if not os.path.exists(filename):
+        return None
+
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_json_file(filename, data):
+    # Written next to the target and renamed over it, so an interrupted run never leaves half a file
+    temp_filename = filename + '.tmp'
+
+    with open(temp_filename, 'w') as f:
+        json.dump(data, f)
+
+    os.rename(temp_filename, filename)
+
+
 class UpdateTimer(object):
     def __init__(self, interval=1.):
         self.__interval = interval
@@ -50,10 +122,20 @@ class PrintStatus(object):
         self.__last_msg = None
         self.__fp = fp
         self.__nl_on_close = nl_on_clone
+        self.__pending = None
 
     def close(self):
+        if self.__pending is not None:
+            get_msg, args = self.__pending
+            msg = get_msg(*args)
+
+            if msg != self.__last_printed_msg:
+                self.__print_status(True, '{}', msg)
+
+            self.__pending = None
+
         if self.__last_msg is not None and self.__last_msg != self.__last_printed_msg:
-            self.__print_status(True, self.__last_msg)
+            self.__print_status(True, '{}', self.__last_msg)
 
         if self.__nl_on_close:
             self.__print_to_out('\n')
@@ -93,6 +175,14 @@ class PrintStatus(object):
         if self.__first_status and printed_status:
             self.__first_status = False
 
+    def print_status_later(self, get_msg, *args):
+        # get_msg(*args) only runs when the status is due, not for every update
+        self.__pending = get_msg, args
+
+        if self.__update_timer.can_update():
+            self.__print_status(True, '{}', get_msg(*args))
+            self.__first_status = False
+
 
 def is_wildcard_element(element):
     return element.startswith('(')
@@ -120,8 +210,44 @@ class RequestsResponseWrapper(object):
 
 
 class RequestsWrapper(object):
-    def __init__(self, firebase_root):
+    def __init__(self, firebase_root, pool_size=10, limiter=None, retry_policy=None):
         self._firebase_root = firebase_root
+        self._limiter = limiter
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.timeout = None
+        self._session = requests.Session()
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+
+    def connection_stats(self):
+        pools = self._adapter.poolmanager.pools
+        total_requests = 0
+        total_connections = 0
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            total_requests += pool.num_requests
+            total_connections += pool.num_connections
+
+        stats = {
+            'requests': total_requests,
+            'hits': total_requests - total_connections,
+            'misses': total_connections,
+        }
+
+        if self._limiter is not None:
+            stats['limit'] = int(self._limiter.limit)
+            stats['limit_decreases'] = self._limiter.decreases
+
+        return stats
+
+    def _release(self, latency=None, overloaded=False):
+        if self._limiter is not None:
+            self._limiter.release(latency=latency, overloaded=overloaded)
 
     def request(self, url, method='GET', **kwargs):
         data = None
@@ -135,28 +261,151 @@ class RequestsWrapper(object):
         if 'redirections' in kwargs:
             del kwargs['redirections']
 
+        attempt = 0
         while True:
+            attempt += 1
+            self._retry_policy.wait_if_open()
+
+            if self._limiter is not None:
+                self._limiter.acquire()
+
+            start_time = time.time()
+            latency = None
+            overloaded = False
+            retry = False
+
+            # The slot is released whatever happens, a broken body or a killed greenlet included
             try:
-                rs = requests.request(method, url, data=data, **kwargs)
-                break
+                rs = self._session.request(method, url, data=data, timeout=self.timeout, **kwargs)
+                latency = time.time() - start_time
+                overloaded = rs.status_code in OVERLOAD_STATUSES
+            except requests.exceptions.ReadTimeout:
+                # Retried like a 504 by the caller, which knows whether the node should be split instead
+                overloaded = True
+                raise
             except (requests.exceptions.SSLError, requests.exceptions.ConnectionError):
-                time.sleep(2.0)
-                continue
+                overloaded = True
+
+                if not self._retry_policy.should_retry(attempt):
+                    raise
+
+                retry = True
+            finally:
+                self._release(latency=latency, overloaded=overloaded)
+
+            if not retry:
+                break
+
+            self._retry_policy.backoff(attempt)
 
         return RequestsResponseWrapper(rs), rs.content
 
+    def stream(self, url, headers=None, timeout=None):
+        return self._session.get(url, headers=headers, stream=True, timeout=timeout)
+
 
 class PlainFirebaseRoot(FirebaseRootCore):
-    def __init__(self, firebase_root):
-        super(PlainFirebaseRoot, self).__init__(firebase_root)
-        self.pool = Pool(50)
+    timeout_errors = (requests.exceptions.ReadTimeout,)
+
+    def __init__(self, firebase_root, pool_size=DEFAULT_CONCURRENCY, adaptive=False, retry_policy=None, cache=None):
+        super(PlainFirebaseRoot, self).__init__(firebase_root, retry_policy=retry_policy, cache=cache)
+        self.pool = Pool(pool_size)
+        self.limiter = AdaptiveLimiter(pool_size) if adaptive else None
+        self._requests_wrapper = RequestsWrapper(
+            self._firebase_root, pool_size=pool_size, limiter=self.limiter, retry_policy=self.retry_policy)
 
     def get_http(self):
-        return RequestsWrapper(self._firebase_root)
+        return self._requests_wrapper
+
+    def connection_stats(self):
+        return self._requests_wrapper.connection_stats()
+
+    def stream(self, path, timeout=None, accept='text/event-stream'):
+        headers = self.stream_headers()
+        headers['Accept'] = accept
+
+        rs = self._requests_wrapper.stream(self.build_url(path), headers=headers, timeout=timeout)
+
+        if rs.status_code >= 400:
+            content = rs.content
+            rs.close()
+            self.validate_http_response(RequestsResponseWrapper(rs), content)
+
+        return rs
+
+    def iterate_children(self, path, timeout=60):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.retry_policy.wait_if_open()
+
+            try:
+                rs = self.stream(path, timeout=timeout, accept='application/json')
+                break
+            except httplib.HTTPException as ex:
+                _, r = ex.args
+
+                if r.status not in RETRY_STATUSES or not self.retry_policy.should_retry(attempt):
+                    raise
+
+                self.retry_policy.backoff(attempt)
+
+        try:
+            for key, value in iterate_json_object(rs.iter_content(chunk_size=STREAM_CHUNK_BYTES)):
+                yield key, value
+        finally:
+            rs.close()
 
     def spawn(self, *args, **kwargs):
         return self.pool.spawn(*args, **kwargs)
 
+    def _get_or_error(self, path, **kwargs):
+        # Returning the error keeps gevent from printing a traceback for a failure get_tree handles
+        try:
+            return self.get(path, **kwargs), None
+        except (httplib.HTTPException, requests.exceptions.ReadTimeout) as ex:
+            return None, ex
+
+    def get_tree(self, path):
+        """GET that splits a node too large or slow for one request into its children, fetched concurrently."""
+        attempt = 0
+        while True:
+            attempt += 1
+
+            value, ex = self.spawn(
+                self._get_or_error, path, retry_statuses=SPLIT_RETRY_STATUSES,
+                handled_statuses=SPLIT_HANDLED_STATUSES).get()
+
+            if ex is None:
+                return value
+
+            if not is_oversized_error(ex):
+                raise ex
+
+            if not is_timeout_error(ex) or attempt >= SPLIT_ATTEMPTS or not self.retry_policy.should_retry(attempt):
+                break
+
+            logging.info('%s: timed out, retrying', path)
+            self.retry_policy.backoff(attempt)
+
+        logging.info('%s: %s, fetching its children separately', path, ex)
+
+        children = self.spawn(self.get, path, shallow=True).get()
+
+        if not isinstance(children, dict):
+            return children
+
+        futures = [(key, gevent.spawn(self.get_tree, path + '/' + key)) for key in children]
+
+        result = {}
+        for key, f in futures:
+            value = f.get()
+
+            if value is not None:
+                result[key] = value
+
+        return result or None
+
 
 def get_elements(path):
     elements = path.split('/')
@@ -178,8 +427,195 @@ def get_elements(path):
     return ['/'.join(e) for e in results]
 
 
+# Firebase's recommended "end of range" character for prefix queries
+KEY_RANGE_END = u'\uf8ff'
+
+_to_char = chr if sys.version_info[0] >= 3 else unichr  # noqa: F821
+
+
+def _anchored_prefix(items, prefix, anchored):
+    # Returns (prefix, first character class after it or None, anchored, whether every item went into prefix),
+    # stops at anything else
+    for op, av in items:
+        if op == sre_parse.AT and av in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING) and not prefix:
+            anchored = True
+        elif op == sre_parse.LITERAL and anchored:
+            prefix += _to_char(av)
+        elif op == sre_parse.SUBPATTERN:
+            prefix, char_class, anchored, complete = _anchored_prefix(av[-1], prefix, anchored)
+
+            # What follows a group that stopped early (a repeat, an alternation) is not right after the prefix
+            if not complete or not anchored:
+                return prefix, char_class, anchored, False
+        elif op == sre_parse.IN and anchored:
+            return prefix, av, anchored, False
+        else:
+            return prefix, None, anchored, False
+
+    return prefix, None, anchored, True
+
+
+def _char_class_bounds(char_class):
+    low, high = None, None
+
+    for op, av in char_class:
+        if op == sre_parse.LITERAL:
+            bounds = av, av
+        elif op == sre_parse.RANGE:
+            bounds = av
+        else:
+            return None
+
+        low = bounds[0] if low is None else min(low, bounds[0])
+        high = bounds[1] if high is None else max(high, bounds[1])
+
+    if low is None:
+        return None
+
+    return low, high
+
+
+def key_range(pattern):
+    """Returns (start, end) for orderBy="$key" holding every key a wildcard regex anchored with ^ can match, or None."""
+    if '(?' in pattern:
+        return None
+
+    try:
+        prefix, char_class, anchored, _ = _anchored_prefix(sre_parse.parse(pattern), u'', False)
+    except (sre_parse.error, ValueError, OverflowError):
+        return None
+
+    if not anchored:
+        return None
+
+    bounds = _char_class_bounds(char_class) if char_class is not None else None
+
+    # Keys that are 32-bit integers come first and in numeric order, a string range would miss them
+    if INTEGER_PREFIX_RE.match(prefix) and (bounds is None or (bounds[0] <= ord('9') and bounds[1] >= ord('-'))):
+        return None
+
+    if bounds is None:
+        return prefix, prefix + KEY_RANGE_END
+
+    return prefix + _to_char(bounds[0]), prefix + _to_char(bounds[1]) + KEY_RANGE_END
+
+
+class PathStep(object):
+    """A wildcard or group element of a path pattern, compiled, and the literal path that follows it."""
+
+    def __init__(self, element, suffix, is_leaf):
+        self.element = element
+        self.regex = re.compile(element) if is_wildcard_element(element) else None
+        self.keys = group_element_to_children_keys(element) if self.regex is None else None
+        self.key_range = key_range(element) if self.regex is not None else None
+        self.suffix = suffix
+        self.is_leaf = is_leaf
+
+    def child_path(self, parent_path, key):
+        if self.suffix:
+            return parent_path + '/' + key + '/' + self.suffix
+
+        return parent_path + '/' + key
+
+
+def compile_path(path):
+    """Returns the literal start of a path pattern and a tuple of the PathStep that follow it."""
+    elements = get_elements(path)
+    steps = []
+
+    index = 1
+    while index < len(elements):
+        element = elements[index]
+        index += 1
+
+        suffix = ''
+        if index < len(elements) and not is_spacial_element(elements[index]):
+            suffix = elements[index]
+            index += 1
+
+        steps.append(PathStep(element, suffix, index == len(elements) and not suffix))
+
+    return elements[0], tuple(steps)
+
+
+def match_path(start_path, steps, path):
+    """Returns the wildcard groups if iterate_path over the compiled pattern can yield path, else None."""
+    keys = path.split('/')
+    start_keys = start_path.split('/') if start_path else []
+
+    if keys[:len(start_keys)] != start_keys:
+        return None
+
+    position = len(start_keys)
+    groups = []
+
+    for step in steps:
+        if position >= len(keys):
+            return None
+
+        key = keys[position]
+        position += 1
+
+        if step.regex is not None:
+            matches = match_keys(step.regex, [key])
+
+            if not matches:
+                return None
+
+            groups.extend(matches[0][1])
+        elif key not in step.keys:
+            return None
+
+        if step.suffix:
+            suffix_keys = step.suffix.split('/')
+
+            if keys[position:position + len(suffix_keys)] != suffix_keys:
+                return None
+
+            position += len(suffix_keys)
+
+    return groups if position == len(keys) else None
+
+
+class CompletionQueue(object):
+    def __init__(self):
+        self.__queue = Queue()
+        self.pending = 0
+
+    def add(self, future):
+        self.pending += 1
+        future.link(self.__queue.put)
+
+    def get(self):
+        future = self.__queue.get()
+        self.pending -= 1
+
+        return future
+
+
 def return_final_result(method):
-    new_futures = []
+    completion_queue = CompletionQueue()
+
+    def return_value(f):
+        if f.exception is not None:
+            raise f.exception
+
+        if f.value is None:
+            return
+
+        if isinstance(f.value, gevent.Greenlet):
+            completion_queue.add(f.value)
+            return
+
+        if not isinstance(f.value, types.GeneratorType):
+            yield f.value
+            return
+
+        for future_or_string in f.value:
+            if isinstance(future_or_string, tuple):
+                yield future_or_string
+            elif isinstance(future_or_string, gevent.Greenlet):
+                completion_queue.add(future_or_string)
 
     for future_or_string in method():
         if future_or_string is None:
@@ -189,134 +625,293 @@ def return_final_result(method):
             yield future_or_string
             continue
 
-        new_futures.append(future_or_string)
+        completion_queue.add(future_or_string)
 
-    while len(new_futures) > 0:
-        gevent.wait(new_futures, count=1)
-        ready_indexes = [i for i, ff in enumerate(new_futures) if ff.ready()]
-        for i in ready_indexes:
-            f = new_futures[i]
-            new_futures[i] = None
+    while completion_queue.pending > 0:
+        for result in return_value(completion_queue.get()):
+            yield result
 
-            if f.value is None:
-                continue
 
-            if isinstance(f.value, gevent.Greenlet):
-                new_futures.append(f.value)
-                continue
+def buffered(generator, maxsize):
+    """Runs generator in its own greenlet, up to maxsize items wait for the consumer."""
+    queue = Queue(maxsize=maxsize)
 
-            if not isinstance(f.value, types.GeneratorType):
-                yield f.value
-                continue
+    def produce():
+        try:
+            for item in generator:
+                queue.put((True, item))
+        except Exception as ex:
+            queue.put((False, ex))
+            return
+
+        queue.put((False, None))
+
+    producer = gevent.spawn(produce)
+
+    try:
+        while True:
+            more, item = queue.get()
+
+            if not more:
+                if item is not None:
+                    raise item
+
+                return
 
-            for future_or_string in f.value:
-                if isinstance(future_or_string, tuple):
-                    yield future_or_string
-                    continue
-                elif isinstance(future_or_string, gevent.Greenlet):
-                    new_futures.append(future_or_string)
+            yield item
+    finally:
+        producer.kill()
 
-        new_futures = [ff for ff in new_futures if ff is not None]
+
+NOT_FETCHED = object()
+
+
+class PathMatch(object):
+    """What a wildcard captured from one child and its position among the matches, linked to the parent match."""
+    __slots__ = ('parent', 'groups', 'position', 'total')
+
+    def __init__(self, parent, groups, position, total):
+        self.parent = parent
+        self.groups = groups
+        self.position = position
+        self.total = total
+
+    def chain(self):
+        matches = []
+        match = self
+        while match is not None:
+            matches.append(match)
+            match = match.parent
+
+        return reversed(matches)
+
+    def all_groups(self):
+        return [group for match in self.chain() for group in match.groups]
+
+    def progress(self):
+        return ' '.join('%s/%s' % (match.position, match.total) for match in self.chain())
+
+
+def format_progress(path, match):
+    return '%s %s' % (path, match.progress())
 
 
 def no_op(val):
     return val
 
 
+_DIGITS_RE = re.compile(r'\d+')
+
+# Wildcards that match every key and capture all of it
+CATCH_ALL_PATTERNS = ('(.*)', '(.+)')
+
+
+def _natural_number(match):
+    # A number sorts by its length without leading zeros, then by its digits
+    digits = match.group().lstrip('0')
+
+    return u'\x00' + _to_char(1 + len(digits)) + digits
+
+
 def natural_key(string_):
-    return [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', string_)]
+    # One string that compares like the list of text and number parts, \x00 ends every text part.
+    # Firebase keys cannot hold control characters, and string comparison runs in C
+    return _DIGITS_RE.sub(_natural_number, string_) + u'\x00'
 
 
-def iterate_path(firebase_root, path, keys_only=False, test_eval=None, descending_order=False):
-    def inner(current_path, groups_with_progress=None):
-        elements = get_elements(current_path)
+def match_keys(regex, keys):
+    """Returns (key, groups) for every key the wildcard regex matches, in the order of keys."""
+    if regex.pattern in CATCH_ALL_PATTERNS:
+        return [(key, (key, )) for key in keys]
+
+    keys = list(keys)
+
+    return [(key, m.groups()) for key, m in zip(keys, map(regex.search, keys)) if m is not None]
+
+
+INTEGER_KEY_RE = re.compile(r'^-?(0|[1-9]\d{0,9})$')
+INTEGER_PREFIX_RE = re.compile(r'^-?\d*$')
 
-        if len(elements) == 0:
-            return
 
-        if len(elements) == 1:
-            yield current_path, groups_with_progress
+def firebase_key_order(key):
+    # orderBy="$key" puts keys that parse as 32-bit integers first, in numeric order
+    if INTEGER_KEY_RE.match(key) and -2 ** 31 <= int(key) < 2 ** 31:
+        return 0, int(key), ''
+
+    return 1, 0, key
+
+
+def iterate_path(firebase_root, path, keys_only=False, test_eval=None, descending_order=False, with_values=False,
+                 page_size=None, branch_keys=None):
+    test_eval = compile_predicate(test_eval)
+    query_state = {'enabled': test_eval is not None and test_eval.query is not None and not keys_only}
+
+    start_path, steps = compile_path(path)
+
+    def inner(current_path, step_index=0, groups_with_progress=None, value=NOT_FETCHED):
+        if step_index == len(steps):
+            yield current_path, groups_with_progress, value
             return
 
-        start_path = elements[0]
+        step = steps[step_index]
 
-        if is_wildcard_element(elements[1]):
-            yield gevent.spawn(spawn_iterate, start_path, elements[:], groups_with_progress)
+        if step.regex is not None:
+            yield gevent.spawn(spawn_iterate, current_path, step_index, groups_with_progress)
             return
 
-        if is_group_element(elements[1]):
-            is_leaf_element = len(elements) == 2
+        if step.is_leaf and not keys_only:
+            yield current_path + '/' + step.element, groups_with_progress, NOT_FETCHED
+            return
 
-            if is_leaf_element and not keys_only:
-                yield '/'.join(elements), groups_with_progress
-                return
+        for child_key in step.keys:
+            for params in inner(step.child_path(current_path, child_key), step_index + 1, groups_with_progress):
+                yield params
+
+    def get_page(start_path, boundary_key, key_range):
+        limit = page_size if boundary_key is None else page_size + 1
+        start_at, end_at = key_range or (None, None)
+
+        if descending_order:
+            params = {'limitToLast': limit}
+            end_at = boundary_key if boundary_key is not None else end_at
+        else:
+            params = {'limitToFirst': limit}
+            start_at = boundary_key if boundary_key is not None else start_at
+
+        if start_at is not None:
+            params['startAt'] = start_at
+        if end_at is not None:
+            params['endAt'] = end_at
+
+        return firebase_root.get(start_path, orderBy='$key', **params)
+
+    def get_children(start_path, step):
+        is_leaf_element = step.is_leaf
+
+        if is_leaf_element and query_state['enabled']:
+            try:
+                return firebase_root.get(start_path, **test_eval.query), True
+            except httplib.HTTPException as ex:
+                _, r = ex.args
+
+                if r.status != 400:
+                    raise
+
+                query_state['enabled'] = False
+                logging.warning('%s: cannot query by %s, filtering every child instead', start_path, test_eval.query)
+
+        # shallow cannot be combined with a range, only worth it when the values are read anyway
+        if is_leaf_element and step.key_range is not None and with_values and not keys_only:
+            start_at, end_at = step.key_range
+
+            try:
+                return firebase_root.get(start_path, orderBy='$key', startAt=start_at, endAt=end_at), True
+            except httplib.HTTPException as ex:
+                if not is_oversized_error(ex):
+                    raise
+
+                logging.info('%s: keys %s to %s are too large for one request, listing every key', start_path,
+                             start_at, end_at)
+
+        return firebase_root.get(start_path, shallow=True), False
+
+    def spawn_iterate(start_path, step_index, current_groups_with_progress):
+        step = steps[step_index]
+        is_leaf_element = step.is_leaf
+
+        def return_child(matches, children, prefetched, offset, total):
+            for i, (child_key, groups) in enumerate(matches):
+                groups_with_progress = PathMatch(current_groups_with_progress, groups, offset + i + 1, total)
+
+                value = children[child_key] if prefetched else NOT_FETCHED
+
+                yield gevent.spawn(
+                    inner, step.child_path(start_path, child_key), step_index + 1, groups_with_progress, value)
 
-            children_names = group_element_to_children_keys(elements[1])
+        def get_and_return_child():
+            children, prefetched = get_children(start_path, step)
 
-            for child_key in children_names:
-                elements[1] = child_key
+            if children is None:
+                return None
 
-                for params in inner('/'.join(elements), groups_with_progress):
-                    yield params
+            # Only the matching keys are sorted, the progress counts them
+            matches = match_keys(step.regex, children)
+            matches.sort(key=lambda match: natural_key(match[0]), reverse=descending_order)
 
-    def spawn_iterate(start_path, elements, current_groups_with_progress):
-        def wrap_return_child(elements, current_groups_with_progress):
-            def return_child(children_names):
-                if children_names is None:
-                    return
+            return return_child(matches, children, prefetched, 0, len(matches))
 
-                pattern = elements[1]
+        def return_page(children_names, children, offset):
+            matches = match_keys(step.regex, children_names)
 
-                children_names = children_names.keys()
+            for child in return_child(matches, children, is_leaf_element, offset, '?'):
+                yield child
+
+            if len(children_names) >= page_size:
+                yield firebase_root.spawn(get_page_and_return_child, children_names[-1], offset + len(matches))
+
+        def get_page_and_return_child(boundary_key, offset):
+            children = get_page(start_path, boundary_key, step.key_range)
+
+            if not isinstance(children, dict):
+                return None
+
+            children_names = sorted(children.keys(), reverse=descending_order, key=firebase_key_order)
+            if boundary_key in children:
+                children_names.remove(boundary_key)
+
+            return return_page(children_names, children, offset)
+
+        if branch_keys is not None and current_groups_with_progress is None:
+            # The first wildcard level was already listed, only these keys are visited
+            matches = match_keys(step.regex, branch_keys)
+            yield gevent.spawn(return_child, matches, None, False, 0, len(matches))
+            return
 
-                children_names = sorted(children_names, reverse=descending_order, key=natural_key)
+        if page_size and not (is_leaf_element and query_state['enabled']):
+            yield firebase_root.spawn(get_page_and_return_child, None, 0)
+            return
 
-                for i, child_key in enumerate(children_names):
-                    m = re.search(pattern, child_key)
+        yield firebase_root.spawn(get_and_return_child)
 
-                    if m is None:
-                        continue
+    def return_path(current_root_path, groups_with_progress, value=NOT_FETCHED):
+        if with_values:
+            return current_root_path, groups_with_progress, value
 
-                    elements[1] = child_key
-                    groups_with_progress = current_groups_with_progress[:] if current_groups_with_progress is not None else []
-                    groups_with_progress.append((m.groups()[0], (i+1, len(children_names))))
+        return current_root_path, groups_with_progress
 
-                    yield gevent.spawn(inner, '/'.join(elements), groups_with_progress)
+    def filter_path(current_root_path, groups_with_progress, value):
+        if value is NOT_FETCHED:
+            value = firebase_root.get(current_root_path)
 
-            return return_child
+        if not test_eval(value):
+            return None
 
-        yield firebase_root.spawn(firebase_root.get, start_path, shallow=True, post_process=wrap_return_child(elements, current_groups_with_progress))
+        return return_path(current_root_path, groups_with_progress, value)
 
     def get_paths():
         with closing(PrintStatus(fp=sys.stderr)) as print_status:
-            for path_with_groups in return_final_result(lambda: inner(path)):
-                current_root_path, groups_with_progress = path_with_groups
-
-                if groups_with_progress:
-                    status = current_root_path
-                    for group_with_progress in groups_with_progress:
-                        _, progress = group_with_progress
-                        status += ' %s/%s' % progress
+            for current_root_path, groups_with_progress, value in return_final_result(lambda: inner(start_path)):
+                if groups_with_progress is not None:
+                    print_status.print_status_later(format_progress, current_root_path, groups_with_progress)
 
-                    print_status.print_status(status)
+                yield current_root_path, groups_with_progress, value
 
-                if test_eval is None:
-                    yield path_with_groups
-                    continue
+    if test_eval is None:
+        for current_root_path, groups_with_progress, value in get_paths():
+            yield return_path(current_root_path, groups_with_progress, value)
 
-                value = firebase_root.get(current_root_path)
+        return
 
-                try:
-                    if test_eval and not eval(test_eval, {}, value):
-                        continue
-                except TypeError:
-                    print('%s: Error while eval value: %s' % (current_root_path, value,))
-                    raise
+    def filter_futures():
+        for current_root_path, groups_with_progress, value in get_paths():
+            spawn = firebase_root.spawn if value is NOT_FETCHED else gevent.spawn
 
-                yield path_with_groups
+            yield current_root_path, spawn(filter_path, current_root_path, groups_with_progress, value)
 
-    for result in return_final_result(get_paths):
-        yield result
+    # A bounded window keeps results streaming while the tree is listed, and raises what failed
+    for _, result in join_in_order(firebase_root, filter_futures()):
+        if result is not None:
+            yield result
 
 
 def join_or_raise(f, throw_exceptions=True):
@@ -329,3 +924,26 @@ def join_or_raise(f, throw_exceptions=True):
             return f.exception
 
     return f.value
+
+
+def join_in_order(firebase_root, futures, throw_exceptions=True):
+    pending = deque()
+
+    def return_ready(block):
+        while pending:
+            key, f = pending[0]
+
+            if not f.ready() and not block and len(pending) < firebase_root.pool.size:
+                break
+
+            pending.popleft()
+            yield key, join_or_raise(f, throw_exceptions=throw_exceptions)
+
+    for key, f in futures:
+        pending.append((key, f))
+
+        for result in return_ready(block=False):
+            yield result
+
+    for result in return_ready(block=True):
+        yield result
@@ -0,0 +1,66 @@
+# coding=utf-8
+import time
+
+from gevent.event import Event
+
+DEFAULT_CONCURRENCY = 50
+
+OVERLOAD_STATUSES = (429, 503, 504)
+
+
+class AdaptiveLimiter(object):
+    """AIMD limit on the number of requests in flight, driven by latency and overload responses."""
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None, decrease_ratio=0.5, latency_ratio=2.0,
+                 cooldown=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or min(max_limit, 10))
+        self.in_flight = 0
+        self.decreases = 0
+        self._decrease_ratio = decrease_ratio
+        self._latency_ratio = latency_ratio
+        self._cooldown = cooldown
+        self._baseline_latency = None
+        self._last_decrease = 0
+        self._released = Event()
+
+    def acquire(self):
+        while self.in_flight >= int(self.limit):
+            self._released.clear()
+            self._released.wait()
+
+        self.in_flight += 1
+
+    def release(self, latency=None, overloaded=False):
+        self.in_flight -= 1
+
+        if overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._observe_latency(latency)
+
+        self._released.set()
+
+    def _observe_latency(self, latency):
+        if self._baseline_latency is None or latency < self._baseline_latency:
+            self._baseline_latency = latency
+        else:
+            # Let the baseline drift up slowly so a permanently slower backend is not an overload forever
+            self._baseline_latency += (latency - self._baseline_latency) * 0.01
+
+        if latency > self._baseline_latency * self._latency_ratio:
+            self._decrease()
+            return
+
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        now = time.time()
+
+        if now - self._last_decrease < self._cooldown:
+            return
+
+        self._last_decrease = now
+        self.decreases += 1
+        self.limit = max(self.min_limit, self.limit * self._decrease_ratio)
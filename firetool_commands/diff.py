@@ -0,0 +1,43 @@
+# coding=utf-8
+import hashlib
+import json
+
+from firetool_commands.base_root_core import _json_handler
+
+
+def content_hash(value):
+    # Canonical JSON, so True and 1 or 1 and 1.5 never hash the same while key order does not matter
+    data = json.dumps(value, sort_keys=True, separators=(',', ':'), default=_json_handler)
+
+    return hashlib.sha1(data.encode('utf8')).hexdigest()
+
+
+def normalize(value):
+    # Firebase does not store empty objects, they read back as null
+    if isinstance(value, dict) and not value:
+        return None
+
+    return value
+
+
+def diff_values(path, src, dest):
+    """Yields the (path, value) writes that turn dest into src, a None value deletes the path."""
+    src, dest = normalize(src), normalize(dest)
+
+    if isinstance(src, dict) and isinstance(dest, dict):
+        for key, value in src.items():
+            if key not in dest:
+                yield path + '/' + key, value
+                continue
+
+            for change in diff_values(path + '/' + key, value, dest[key]):
+                yield change
+
+        for key in dest:
+            if key not in src:
+                yield path + '/' + key, None
+
+        return
+
+    if content_hash(src) != content_hash(dest):
+        yield path, src
@@ -0,0 +1,113 @@
+# coding=utf-8
+import codecs
+import json
+
+_whitespace = ' \t\n\r'
+
+
+class _StreamReader(object):
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf8')()
+        self._json_decoder = json.JSONDecoder()
+        self._parts = []
+        self._parts_size = 0
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_chunk(self):
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+
+            if text:
+                self._parts.append(text)
+                self._parts_size += len(text)
+                return
+
+        self._parts.append(self._decoder.decode(b'', True))
+        self.eof = True
+
+    def _join(self):
+        if not self._parts:
+            return
+
+        self.buf = self.buf[self.pos:] + ''.join(self._parts)
+        self.pos = 0
+        self._parts = []
+        self._parts_size = 0
+
+    def available(self):
+        return len(self.buf) - self.pos + self._parts_size
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _whitespace:
+                self.pos += 1
+
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if self.eof:
+                return None
+
+            self._read_chunk()
+            self._join()
+
+    def decode(self):
+        while True:
+            self._join()
+
+            try:
+                value, end = self._json_decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+
+            # Wait for twice the data before decoding again, a large value is decoded a few times, not once per chunk
+            target = 2 * self.available() + 1
+            while not self.eof and self.available() < target:
+                self._read_chunk()
+
+
+def iterate_json_object(chunks):
+    """Yields (key, value) for the top level children of a JSON object read from chunks of bytes, else (None, value)."""
+    reader = _StreamReader(chunks)
+
+    first = reader.peek()
+    if first is None:
+        return
+
+    if first != '{':
+        yield None, reader.decode()
+        return
+
+    reader.pos += 1
+
+    while True:
+        c = reader.peek()
+
+        if c is None:
+            raise ValueError('unexpected end of JSON object')
+
+        if c == '}':
+            return
+
+        if c == ',':
+            reader.pos += 1
+            continue
+
+        key = reader.decode()
+
+        if reader.peek() != ':':
+            raise ValueError('expected : after key %s' % key)
+
+        reader.pos += 1
+        reader.peek()
+
+        yield key, reader.decode()
@@ -1,15 +1,36 @@
 # coding=utf-8
 import csv
+import functools
 import json
-from httplib import HTTPException
+import logging
+import re
+import time
 
 import click
 import gevent
 import six
 
+try:
+    from httplib import HTTPException
+except ImportError:
+    from http.client import HTTPException
+
 from firetool_commands.auth import get_firebase
+from firetool_commands.batch import MultiPatchWriter, DEFAULT_MAX_BATCH_BYTES, parent_path
+from firetool_commands.cache import DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_BYTES
+from firetool_commands.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_EVERY
+from firetool_commands.concurrency import DEFAULT_CONCURRENCY
+from firetool_commands.diff import diff_values
+from firetool_commands.predicate import compile_predicate, PredicateError
+from firetool_commands.shards import NdjsonShardWriter, COMPRESSIONS, DEFAULT_MAX_SHARD_BYTES, \
+    DEFAULT_MAX_PENDING_CHUNKS, read_shard
 from firetool_commands.common import iterate_path, join_or_raise, is_group_element, group_element_to_children_keys, \
-    fill_wildcards, no_op
+    fill_wildcards, no_op, NOT_FETCHED, load_json_file, save_json_file, buffered, \
+    is_oversized_error, compile_path, join_in_order, match_path
+from firetool_commands.watch import watch_node
+
+
+DEFAULT_COPY_QUEUE_SIZE = 1000
 
 
 def get_and_join(firebase_root, path, child_keys, throw_exceptions=True):
@@ -17,7 +38,7 @@ def get_and_join(firebase_root, path, child_keys, throw_exceptions=True):
 
     for key in child_keys:
         current_path = path + '/' + key
-        f = firebase_root.spawn(firebase_root.get, current_path)
+        f = gevent.spawn(firebase_root.get_tree, current_path)
         futures.append(f)
 
     result = {}
@@ -42,28 +63,55 @@ def firebase_get(firebase_root, current_path, throw_exceptions=True):
             get_and_join, firebase_root, path, group_element_to_children_keys(last_element),
             throw_exceptions=throw_exceptions)
     else:
-        return firebase_root.spawn(firebase_root.get, current_path)
+        return gevent.spawn(firebase_root.get_tree, current_path)
 
 
-def list_values(firebase_root, root_path, throw_exceptions=True, shallow=False, keys_only=False,descending_order=False, test_eval=None):
-    def inner():
-        for iterate_current_path, iterate_current_groups in iterate_path(
-                firebase_root, root_path, keys_only=keys_only, descending_order=descending_order, test_eval=test_eval):
+def return_batches(batches, on_batch=None, skip_failed=False):
+    """Yields the (tag, path, value) writes of finished batches, raises the error of a failed one unless skip_failed."""
+    for batch in batches:
+        if on_batch is not None:
+            on_batch(batch)
+
+        if batch.exception:
+            # on_batch has reported it, the other batches go on
+            if skip_failed and isinstance(batch.exception, HTTPException):
+                continue
 
-            def return_value():
-                if shallow or keys_only:
-                    return {}
+            raise batch.exception
 
+        for result in batch.tags:
+            yield result
+
+
+def list_values(firebase_root, root_path, throw_exceptions=True, shallow=False, keys_only=False,descending_order=False, test_eval=None,
+                page_size=None, branch_keys=None):
+    # Without values the leaf level is listed with shallow=true, never with a range read that downloads them
+    with_values = not (shallow or keys_only)
+
+    def create_futures():
+        for result in iterate_path(
+                firebase_root, root_path, keys_only=keys_only, descending_order=descending_order, test_eval=test_eval,
+                with_values=with_values, page_size=page_size, branch_keys=branch_keys):
+            iterate_current_path, iterate_current_groups = result[:2]
+            iterate_current_value = result[2] if with_values else NOT_FETCHED
+
+            if not with_values:
+                f = gevent.spawn(no_op, {})
+            elif iterate_current_value is not NOT_FETCHED:
+                f = gevent.spawn(no_op, iterate_current_value)
+            else:
                 f = firebase_get(firebase_root, iterate_current_path, throw_exceptions=throw_exceptions)
-                return join_or_raise(f, throw_exceptions)
 
-            yield iterate_current_path, iterate_current_groups, return_value()
+            yield (iterate_current_path, iterate_current_groups), f
 
-    for current_root_path, current_groups, value in inner():
+    for (current_root_path, current_groups), value in join_in_order(
+            firebase_root, create_futures(), throw_exceptions=throw_exceptions):
         yield current_root_path, current_groups, value
 
 
-def delete_values(firebase_root, path, throw_exceptions=True, dry=False, test_eval=None):
+def delete_values(firebase_root, path, throw_exceptions=True, dry=False, test_eval=None, batch_size=1,
+                  max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, retries=3, on_batch=None, page_size=None, branch_keys=None,
+                  on_error=None):
     def delete_value(current_path):
         if not dry:
             firebase_root.delete(current_path)
@@ -71,48 +119,153 @@ def delete_values(firebase_root, path, throw_exceptions=True, dry=False, test_ev
         return current_path
 
     def create_futures():
-        for iterate_current_path, iterate_current_groups in iterate_path(firebase_root, path, test_eval=test_eval):
+        for iterate_current_path, iterate_current_groups in iterate_path(
+                firebase_root, path, test_eval=test_eval, page_size=page_size, branch_keys=branch_keys):
             yield iterate_current_path, gevent.spawn(delete_value, iterate_current_path)
 
-    for current_root_path, f in create_futures():
-        try:
-            val = join_or_raise(f)
-        except HTTPException as ex:
-            print('%s: %s' % (ex, current_root_path, ))
-            continue
+    def delete_paths():
+        for current_root_path, f in create_futures():
+            try:
+                val = join_or_raise(f)
+            except HTTPException as ex:
+                if on_error is not None:
+                    on_error(current_root_path, ex)
+                else:
+                    print('%s: %s' % (ex, current_root_path, ))
+
+                continue
+
+            yield current_root_path, val
+
+    def patch_paths():
+        writer = MultiPatchWriter(
+            firebase_root, max_items=batch_size, max_bytes=max_batch_bytes, dry=dry, retries=retries)
+
+        def return_deleted(batches):
+            for current_root_path, _, _ in return_batches(batches, on_batch=on_batch, skip_failed=True):
+                yield current_root_path, current_root_path
+
+        for iterate_current_path, iterate_current_groups in iterate_path(
+                firebase_root, path, test_eval=test_eval, page_size=page_size, branch_keys=branch_keys):
+            for result in return_deleted(writer.add(iterate_current_path, None, tag=iterate_current_path)):
+                yield result
 
+        for result in return_deleted(writer.flush()):
+            yield result
+
+    delete_generator = patch_paths() if batch_size > 1 else delete_paths()
+
+    for current_root_path, val in delete_generator:
         if not val:
             continue
 
         yield current_root_path, val
 
 
-def count_values(firebase_root, root_path, throw_exceptions=True, shallow=False, keys_only=False, condition=None, descending_order=False):
-    def inner():
+def count_keys(firebase_root, path, depth=1):
+    counts = []
+    level_paths = [path]
+
+    for _ in range(depth):
+        futures = [firebase_root.spawn(firebase_root.get, level_path, shallow=True) for level_path in level_paths]
+
+        next_level_paths = []
+        for level_path, future in zip(level_paths, futures):
+            keys = join_or_raise(future)
+
+            if isinstance(keys, dict):
+                next_level_paths.extend(level_path + '/' + key for key in keys)
+
+        counts.append(len(next_level_paths))
+        level_paths = next_level_paths
+
+    return counts
+
+
+def count_values(firebase_root, root_path, throw_exceptions=True, depth=1, test_eval=None, descending_order=False,
+                 page_size=None):
+    def create_futures():
         for iterate_current_path, iterate_current_groups in iterate_path(
-                firebase_root, root_path, keys_only=keys_only, condition=condition, descending_order=descending_order):
+                firebase_root, root_path, test_eval=test_eval, descending_order=descending_order, page_size=page_size):
+            yield iterate_current_path, gevent.spawn(count_keys, firebase_root, iterate_current_path, depth)
+
+    return join_in_order(firebase_root, create_futures(), throw_exceptions=throw_exceptions)
+
+
+def export_values(firebase_root, root_path, throw_exceptions=True, test_eval=None, page_size=None):
+    def create_futures():
+        for iterate_current_path, iterate_current_groups, iterate_current_value in iterate_path(
+                firebase_root, root_path, test_eval=test_eval, with_values=True, page_size=page_size):
+            if iterate_current_value is NOT_FETCHED:
+                f = firebase_get(firebase_root, iterate_current_path, throw_exceptions=throw_exceptions)
+            else:
+                f = gevent.spawn(no_op, iterate_current_value)
+
+            yield iterate_current_path, f
+
+    return join_in_order(firebase_root, create_futures(), throw_exceptions=throw_exceptions)
+
+
+def stream_values(firebase_root, root_path, throw_exceptions=True, descending_order=False, page_size=None):
+    def split_path(current_path):
+        children = firebase_root.get(current_path, shallow=True)
+
+        if not isinstance(children, dict):
+            yield current_path, children
+            return
+
+        futures = ((current_path + '/' + key, gevent.spawn(firebase_root.get_tree, current_path + '/' + key))
+                   for key in children)
+
+        for result in join_in_order(firebase_root, futures, throw_exceptions=throw_exceptions):
+            yield result
 
-            total_keys = 0
-            for _ in iterate_path(firebase_root, iterate_current_path + '/(.*)', keys_only=True):
-                total_keys += 1
+    def stream_path(current_path):
+        try:
+            for key, value in firebase_root.iterate_children(current_path):
+                yield (current_path if key is None else current_path + '/' + key), value
+        except HTTPException as ex:
+            if not is_oversized_error(ex):
+                if throw_exceptions:
+                    raise
+
+                yield current_path, ex
+                return
+
+            for result in split_path(current_path):
+                yield result
+
+    for iterate_current_path, iterate_current_groups in iterate_path(
+            firebase_root, root_path, descending_order=descending_order, page_size=page_size):
+        elements = iterate_current_path.split('/')
+
+        if is_group_element(elements[-1]):
+            paths = ['/'.join(elements[:-1] + [key]) for key in group_element_to_children_keys(elements[-1])]
+        else:
+            paths = [iterate_current_path]
 
-            yield iterate_current_path, iterate_current_groups, total_keys
+        for current_path in paths:
+            for result in stream_path(current_path):
+                yield result
 
-    for current_root_path, current_groups, counter in inner():
-        yield current_root_path, counter
 
+def copy_values(firebase_root, src_path, dest_path, processor=None, dry=False, set_value=None, test_eval=None,
+                batch_size=1, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, page_size=None, branch_keys=None,
+                dest_root=None, queue_size=DEFAULT_COPY_QUEUE_SIZE):
+    dest_root = dest_root or firebase_root
 
-def copy_values(firebase_root, src_path, dest_path, processor=None, dry=False, set_value=None, condition=None, test_eval=None):
     def inner_copy_values():
-        list_generator = list_values(firebase_root, src_path, condition=condition, test_eval=test_eval)
+        list_generator = list_values(
+            firebase_root, src_path, test_eval=test_eval, page_size=page_size, branch_keys=branch_keys)
         for current_path, current_groups, val in list_generator:
             if processor:
                 val = processor(current_path, val)
 
-            dest_path_full = fill_wildcards(dest_path, current_groups, val)
+            groups = current_groups.all_groups() if current_groups is not None else []
+            dest_path_full = fill_wildcards(dest_path, groups, val if isinstance(val, dict) else None)
 
             if set_value is not None:
-                val = fill_wildcards(set_value, current_groups, val)
+                val = fill_wildcards(set_value, groups, val if isinstance(val, dict) else None)
 
                 if val:
                     if val.lower() == 'true':
@@ -120,14 +273,236 @@ def copy_values(firebase_root, src_path, dest_path, processor=None, dry=False, s
                     elif val.lower() == 'false':
                         val = False
 
-            if dry:
-                yield current_path, dest_path_full, gevent.spawn(no_op, val)
-                continue
+            yield current_path, dest_path_full, val
+
+    def put_values():
+        def create_futures():
+            for current_path, dest_path_full, val in buffered(inner_copy_values(), queue_size):
+                if dry:
+                    f = gevent.spawn(no_op, val)
+                else:
+                    f = dest_root.spawn(dest_root.put, dest_path_full, val)
+
+                yield (current_path, dest_path_full), f
+
+        for (current_path, dest_path_full), val in join_in_order(dest_root, create_futures()):
+            yield current_path, dest_path_full, val
+
+    def patch_values():
+        writer = MultiPatchWriter(
+            dest_root, max_items=batch_size, max_bytes=max_batch_bytes, dry=dry, max_pending=dest_root.pool.size)
+
+        for current_path, dest_path_full, val in buffered(inner_copy_values(), queue_size):
+            for result in return_batches(writer.add(dest_path_full, val, tag=current_path)):
+                yield result
+
+        for result in return_batches(writer.flush()):
+            yield result
+
+    copy_generator = patch_values() if batch_size > 1 else put_values()
+
+    for root_path, dest_path_full, value in copy_generator:
+        yield root_path, dest_path_full, value
+
+
+def fetch_pair(firebase_root, src_path, src_value, dest_path, test_eval=None):
+    if test_eval is not None:
+        if src_value is NOT_FETCHED:
+            src_value = join_or_raise(firebase_get(firebase_root, src_path))
+
+        if not test_eval(src_value):
+            return None
+
+    src_future = None
+    if src_value is NOT_FETCHED:
+        src_future = firebase_get(firebase_root, src_path)
+
+    dest_value = join_or_raise(firebase_get(firebase_root, dest_path))
 
-            yield current_path, dest_path_full, firebase_root.spawn(firebase_root.put, dest_path_full, val)
+    if src_future is not None:
+        src_value = join_or_raise(src_future)
 
-    for root_path, groups, future in inner_copy_values():
-        yield root_path, groups, join_or_raise(future)
+    return src_value, dest_value
+
+
+def mirrors_children(src_path, dest_path):
+    """True when the last element of dest_path is exactly a group of the last wildcard of src_path."""
+    _, steps = compile_path(src_path)
+
+    if not steps or steps[-1].regex is None or not steps[-1].is_leaf:
+        return False
+
+    first_group = sum(step.regex.groups for step in steps[:-1] if step.regex is not None) + 1
+    m = re.match(r'^\\(\d+)$', dest_path.rstrip('/').rsplit('/', 1)[-1])
+
+    return m is not None and first_group <= int(m.group(1)) < first_group + steps[-1].regex.groups
+
+
+def sync_values(firebase_root, src_path, dest_path, dry=False, test_eval=None, batch_size=500,
+                max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, retries=3, page_size=None, delete_extraneous=True,
+                on_batch=None):
+    writer = MultiPatchWriter(
+        firebase_root, max_items=batch_size, max_bytes=max_batch_bytes, dry=dry, max_pending=firebase_root.pool.size,
+        retries=retries)
+
+    test_eval = compile_predicate(test_eval)
+
+    # Only when every child of a destination parent comes from a source child, anything else there is a sibling
+    if delete_extraneous and not mirrors_children(src_path, dest_path):
+        logging.warning(
+            '%s: not deleting extraneous keys, its last element is not a group of the last wildcard of %s',
+            dest_path, src_path)
+        delete_extraneous = False
+
+    seen_children = {} if delete_extraneous else None
+
+    # Children that --test-eval leaves out still exist in the source, every child is listed to know them
+    list_test_eval = test_eval if seen_children is None else None
+    pair_test_eval = test_eval if seen_children is not None else None
+
+    def create_futures():
+        for current_path, current_groups, current_value in iterate_path(
+                firebase_root, src_path, test_eval=list_test_eval, with_values=True, page_size=page_size):
+            groups = current_groups.all_groups() if current_groups is not None else []
+            dest_path_full = fill_wildcards(dest_path, groups, current_value if isinstance(current_value, dict) else None)
+
+            if seen_children is not None:
+                seen_children.setdefault(parent_path(dest_path_full), set()).add(dest_path_full.rsplit('/', 1)[-1])
+
+            f = gevent.spawn(fetch_pair, firebase_root, current_path, current_value, dest_path_full, pair_test_eval)
+
+            yield (current_path, dest_path_full), f
+
+    for (current_path, dest_path_full), pair in join_in_order(firebase_root, create_futures()):
+        if pair is None:
+            continue
+
+        src_value, dest_value = pair
+
+        for change_path, change_value in diff_values(dest_path_full, src_value, dest_value):
+            for result in return_batches(writer.add(change_path, change_value, tag=current_path), on_batch):
+                yield result
+
+    for parent, children in (seen_children or {}).items():
+        existing = firebase_root.get(parent, shallow=True)
+
+        if not isinstance(existing, dict):
+            continue
+
+        for key in existing:
+            if key not in children:
+                for result in return_batches(writer.add(parent + '/' + key, None, tag=None), on_batch):
+                    yield result
+
+    for result in return_batches(writer.flush(), on_batch):
+        yield result
+
+
+def read_import_records(filenames, src_path=None, dest_path=None, offset=None):
+    # --src is a path pattern like --path: a wildcard matches one key, {a,b} lists keys
+    src_pattern = compile_path(src_path.strip('/')) if src_path else None
+
+    if offset is not None and offset['file'] in filenames:
+        filenames = filenames[filenames.index(offset['file']):]
+    else:
+        offset = None
+
+    for filename in filenames:
+        start_line, start_index = 0, 0
+        if offset is not None and offset['file'] == filename:
+            start_line, start_index = offset['line'], offset['index'] + 1
+
+        for line_number, index, path, value in read_shard(filename, start_line, start_index):
+            path = path.strip('/')
+            dest_path_full = path
+
+            if src_pattern is not None:
+                groups = match_path(src_pattern[0], src_pattern[1], path)
+
+                if groups is None:
+                    continue
+
+                if dest_path:
+                    groups = [group or '' for group in groups]
+                    dest_path_full = fill_wildcards(dest_path, groups, value if isinstance(value, dict) else None)
+
+            yield (filename, line_number, index), path, dest_path_full, value
+
+
+def import_values(firebase_root, filenames, src_path=None, dest_path=None, dry=False, batch_size=500,
+                  max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, retries=3, offset=None, on_batch=None):
+    writer = MultiPatchWriter(
+        firebase_root, max_items=batch_size, max_bytes=max_batch_bytes, dry=dry, max_pending=firebase_root.pool.size,
+        retries=retries)
+
+    for position, path, dest_path_full, value in read_import_records(filenames, src_path, dest_path, offset):
+        for result in return_batches(writer.add(dest_path_full, value, tag=(position, path)), on_batch):
+            yield result
+
+    for result in return_batches(writer.flush(), on_batch):
+        yield result
+
+
+def validate_test_eval(ctx, param, value):
+    try:
+        return compile_predicate(value)
+    except PredicateError as ex:
+        raise click.BadParameter(str(ex))
+
+
+def uncached(firebase_settings, command):
+    # Writes are decided on what the database holds now, never on responses cached by an earlier command,
+    # and what is cached for the project is stale once they run
+    if firebase_settings.get('cache'):
+        click.echo('%s does not read --cache, clearing it' % command, err=True)
+
+    return dict(firebase_settings, cache=False, clear_cache=firebase_settings.get('cache', False))
+
+
+FIREBASE_OPTIONS = ('concurrency', 'adaptive', 'retry_attempts', 'retry_budget', 'cache', 'cache_ttl', 'cache_max_bytes')
+
+
+def firebase_options(func):
+    # Collects the options below into a firebase_settings dict for get_firebase
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        kwargs['firebase_settings'] = dict((name, kwargs.pop(name)) for name in FIREBASE_OPTIONS)
+
+        return func(*args, **kwargs)
+
+    wrapper = click.option('--cache-max-bytes', type=int, default=DEFAULT_CACHE_MAX_BYTES)(wrapper)
+    wrapper = click.option('--cache-ttl', type=int, default=DEFAULT_CACHE_TTL)(wrapper)
+    wrapper = click.option('--cache/--no-cache', default=False)(wrapper)
+    wrapper = click.option('--retry-budget', type=int, default=1000)(wrapper)
+    wrapper = click.option('--retry-attempts', type=int, default=8)(wrapper)
+    wrapper = click.option('--adaptive/--no-adaptive', default=False)(wrapper)
+    wrapper = click.option('--concurrency', type=int, default=DEFAULT_CONCURRENCY)(wrapper)
+    return wrapper
+
+
+def checkpoint_options(func):
+    func = click.option('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY)(func)
+    func = click.option('--checkpoint', required=False)(func)
+    return func
+
+
+def checkpoint_windows(firebase_root, path, checkpoint_filename, checkpoint_every, dry):
+    if not checkpoint_filename or dry:
+        yield None
+        return
+
+    checkpoint = Checkpoint(checkpoint_filename)
+
+    try:
+        windows = checkpoint.windows(firebase_root, path, size=checkpoint_every)
+
+        if checkpoint.completed(path):
+            click.echo('%s: resuming after %s branches' % (path, checkpoint.completed(path)), err=True)
+
+        for branch_keys in windows:
+            yield branch_keys
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint='--checkpoint')
 
 
 @click.group('op')
@@ -146,14 +521,23 @@ def write_csv_line(values):
 @click.command('count')
 @click.option('--path', required=True)
 @click.option('--project', '-p', required=True)
-@click.option('--shallow/--no-shallow', default=False)
-@click.option('--condition', required=False)
+@click.option('--depth', type=int, default=1)
+@click.option('--test-eval', required=False, callback=validate_test_eval)
 @click.option('--desc/--asc', required=False)
-def count_command(path, project, shallow, condition, desc):
-    firebase = get_firebase(project)
+@click.option('--page-size', type=int, required=False)
+@firebase_options
+def count_command(path, project, depth, test_eval, desc, page_size, firebase_settings):
+    firebase = get_firebase(project, **firebase_settings)
+
+    count_generator = count_values(
+        firebase, path, throw_exceptions=False, depth=depth, test_eval=test_eval, descending_order=desc,
+        page_size=page_size)
+
+    for key, counts in count_generator:
+        if isinstance(counts, Exception):
+            continue
 
-    for key, total_keys in count_values(firebase, path, throw_exceptions=False, shallow=shallow, condition=condition, descending_order=desc):
-        click.echo('%s: %s' % (key, total_keys))
+        click.echo('%s: %s' % (key, ', '.join(str(c) for c in counts)))
 
 
 @click.command('list')
@@ -162,13 +546,27 @@ def count_command(path, project, shallow, condition, desc):
 @click.option('--shallow/--no-shallow', default=False)
 @click.option('--outputFormat', '-o', type=click.Choice(['json', 'csv']), default='json', required=False)
 @click.option('--desc/--asc', required=False)
-@click.option('--test-eval', required=False)
-def list_command(path, project, shallow, outputformat, desc, test_eval):
-    firebase = get_firebase(project)
+@click.option('--test-eval', required=False, callback=validate_test_eval)
+@click.option('--page-size', type=int, required=False)
+@click.option('--stream/--no-stream', default=False)
+@firebase_options
+def list_command(path, project, shallow, outputformat, desc, test_eval, page_size, stream, firebase_settings):
+    firebase = get_firebase(project, **firebase_settings)
+
+    if stream and (shallow or test_eval is not None):
+        raise click.BadParameter('cannot be used with --shallow or --test-eval', param_hint='--stream')
 
     header_keys = None
 
-    list_generator = list_values(firebase, path, throw_exceptions=False, shallow=shallow, descending_order=desc, test_eval=test_eval)
+    if stream:
+        list_generator = (
+            (child_path, None, value) for child_path, value in stream_values(
+                firebase, path, throw_exceptions=False, descending_order=desc, page_size=page_size))
+    else:
+        list_generator = list_values(
+            firebase, path, throw_exceptions=False, shallow=shallow, descending_order=desc, test_eval=test_eval,
+            page_size=page_size)
+
     for path, groups, value in list_generator:
         if value is None:
             continue
@@ -206,36 +604,243 @@ def list_command(path, project, shallow, outputformat, desc, test_eval):
 @click.option('--src', '-s', required=True)
 @click.option('--dest', '-d', required=True)
 @click.option('--project', '-p', required=True)
+@click.option('--dest-project', required=False)
+@click.option('--queue-size', type=int, default=DEFAULT_COPY_QUEUE_SIZE)
 @click.option('--dry/--no-dry', default=False)
-@click.option('--value', default=False)
-@click.option('--condition', required=False)
-@click.option('--test-eval', required=False)
-def copy_command(src, dest, project, dry, value, condition, test_eval):
-    copy_generator = copy_values(get_firebase(project), src, dest, dry=dry, set_value=value, condition=condition, test_eval=test_eval)
-    for src, dest, value in copy_generator:
-        if value is None:
-            continue
+@click.option('--value', default=None)
+@click.option('--test-eval', required=False, callback=validate_test_eval)
+@click.option('--batch-size', type=int, default=1)
+@click.option('--max-batch-bytes', type=int, default=DEFAULT_MAX_BATCH_BYTES)
+@click.option('--page-size', type=int, required=False)
+@checkpoint_options
+@firebase_options
+def copy_command(src, dest, project, dest_project, queue_size, dry, value, test_eval, batch_size, max_batch_bytes,
+                 page_size, checkpoint, checkpoint_every, firebase_settings):
+    if not dry:
+        firebase_settings = uncached(firebase_settings, 'copy')
+
+    firebase = get_firebase(project, **firebase_settings)
+    dest_firebase = get_firebase(dest_project, **firebase_settings) if dest_project else firebase
+
+    for branch_keys in checkpoint_windows(firebase, src, checkpoint, checkpoint_every, dry):
+        copy_generator = copy_values(
+            firebase, src, dest, dry=dry, set_value=value, test_eval=test_eval,
+            batch_size=batch_size, max_batch_bytes=max_batch_bytes, page_size=page_size, branch_keys=branch_keys,
+            dest_root=dest_firebase, queue_size=queue_size)
+
+        for src_path, dest_path, current_value in copy_generator:
+            if current_value is None:
+                continue
 
-        if isinstance(value, Exception):
-            continue
+            if isinstance(current_value, Exception):
+                continue
 
-        output_data = json.dumps(value)
+            output_data = json.dumps(current_value)
 
-        if len(output_data) > 1024:
-            click.echo("%s => %s size: %s" % (src, dest, len(output_data)))
-        else:
-            click.echo("%s => %s %s" % (src, dest, output_data))
+            if len(output_data) > 1024:
+                click.echo("%s => %s size: %s" % (src_path, dest_path, len(output_data)))
+            else:
+                click.echo("%s => %s %s" % (src_path, dest_path, output_data))
 
 
 @click.command('delete')
 @click.option('--path', required=True, multiple=True)
 @click.option('--project', '-p', required=True)
 @click.option('--dry/--no-dry', default=False)
-@click.option('--test-eval', required=False)
-def delete_command(path, project, dry, test_eval):
+@click.option('--test-eval', required=False, callback=validate_test_eval)
+@click.option('--batch-size', type=int, default=1)
+@click.option('--max-batch-bytes', type=int, default=DEFAULT_MAX_BATCH_BYTES)
+@click.option('--retries', type=int, default=3)
+@click.option('--page-size', type=int, required=False)
+@checkpoint_options
+@firebase_options
+def delete_command(path, project, dry, test_eval, batch_size, max_batch_bytes, retries, page_size, checkpoint,
+                   checkpoint_every, firebase_settings):
+    firebase = get_firebase(project, **uncached(firebase_settings, 'delete'))
+
+    failed = []
+
+    def print_batch(batch):
+        if batch.exception:
+            failed.extend(deleted_path for deleted_path, _, _ in batch.tags)
+            click.echo('batch %s: %s paths failed after %s attempts: %s' % (
+                batch.common or '/', len(batch), batch.attempts, batch.exception), err=True)
+            return
+
+        click.echo('batch %s: %s paths, %s bytes, %s attempts' % (
+            batch.common or '/', len(batch), batch.size, batch.attempts), err=True)
+
+    def print_error(failed_path, ex):
+        failed.append(failed_path)
+        click.echo('%s: %s' % (ex, failed_path), err=True)
+
     for current_path in path:
-        for deleted_path, value in delete_values(get_firebase(project), current_path, dry=dry, test_eval=test_eval):
+        for branch_keys in checkpoint_windows(firebase, current_path, checkpoint, checkpoint_every, dry):
+            delete_generator = delete_values(
+                firebase, current_path, dry=dry, test_eval=test_eval, batch_size=batch_size,
+                max_batch_bytes=max_batch_bytes, retries=retries, on_batch=print_batch, page_size=page_size,
+                branch_keys=branch_keys, on_error=print_error)
+
+            for deleted_path, value in delete_generator:
+                if isinstance(value, Exception):
+                    continue
+
+                click.echo("delete %s" % deleted_path)
+
+            if checkpoint and failed:
+                raise click.ClickException(
+                    '%s deletes failed, the checkpoint was not advanced past them, run again to retry' % len(failed))
+
+
+@click.command('export')
+@click.option('--path', required=True, multiple=True)
+@click.option('--project', '-p', required=True)
+@click.option('--output', '-o', required=True)
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='none')
+@click.option('--max-shard-bytes', type=int, default=DEFAULT_MAX_SHARD_BYTES)
+@click.option('--buffer-chunks', type=int, default=DEFAULT_MAX_PENDING_CHUNKS)
+@click.option('--test-eval', required=False, callback=validate_test_eval)
+@click.option('--page-size', type=int, required=False)
+@click.option('--stream/--no-stream', default=False)
+@firebase_options
+def export_command(path, project, output, compression, max_shard_bytes, buffer_chunks, test_eval, page_size, stream,
+                   firebase_settings):
+    firebase = get_firebase(project, **firebase_settings)
+
+    if stream and test_eval is not None:
+        raise click.BadParameter('cannot be used with --test-eval', param_hint='--stream')
+
+    try:
+        writer = NdjsonShardWriter(
+            output, compression=compression, max_shard_bytes=max_shard_bytes, max_pending_chunks=buffer_chunks)
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint='--compression')
+
+    failed = 0
+    for current_path in path:
+        if stream:
+            export_generator = stream_values(firebase, current_path, throw_exceptions=False, page_size=page_size)
+        else:
+            export_generator = export_values(
+                firebase, current_path, throw_exceptions=False, test_eval=test_eval, page_size=page_size)
+
+        for exported_path, value in export_generator:
             if isinstance(value, Exception):
+                failed += 1
                 continue
 
-            click.echo("delete %s" % deleted_path)
+            if value is None:
+                continue
+
+            writer.write(exported_path, value)
+
+    writer.close()
+
+    click.echo('exported %s paths (%s bytes) to %s shards, %s failed' % (
+        writer.lines, writer.bytes, len(writer.shards), failed), err=True)
+
+
+@click.command('import')
+@click.argument('filenames', nargs=-1, required=True)
+@click.option('--project', '-p', required=True)
+@click.option('--src', '-s', required=False)
+@click.option('--dest', '-d', required=False)
+@click.option('--dry/--no-dry', default=False)
+@click.option('--batch-size', type=int, default=500)
+@click.option('--max-batch-bytes', type=int, default=DEFAULT_MAX_BATCH_BYTES)
+@click.option('--retries', type=int, default=3)
+@click.option('--offset-file', required=False)
+@firebase_options
+def import_command(filenames, project, src, dest, dry, batch_size, max_batch_bytes, retries, offset_file,
+                   firebase_settings):
+    firebase = get_firebase(project, **uncached(firebase_settings, 'import'))
+
+    offset = load_json_file(offset_file) if offset_file else None
+    if offset is not None:
+        click.echo('resuming after %s line %s' % (offset['file'], offset['line']), err=True)
+
+    def save_batch(batch):
+        if batch.exception:
+            click.echo('batch %s: %s paths failed after %s attempts: %s' % (
+                batch.common or '/', len(batch), batch.attempts, batch.exception), err=True)
+            return
+
+        if offset_file and not dry:
+            (filename, line_number, index), _ = batch.tags[-1][0]
+            save_json_file(offset_file, {'file': filename, 'line': line_number, 'index': index})
+
+    start = time.time()
+    imported = 0
+
+    import_generator = import_values(
+        firebase, list(filenames), src_path=src, dest_path=dest, dry=dry, batch_size=batch_size,
+        max_batch_bytes=max_batch_bytes, retries=retries, offset=offset, on_batch=save_batch)
+
+    try:
+        for (_, path), dest_path_full, value in import_generator:
+            imported += 1
+
+            if dry:
+                click.echo('%s => %s' % (path, dest_path_full))
+    except HTTPException as ex:
+        raise click.ClickException('import stopped after %s paths: %s' % (imported, ex))
+
+    elapsed = max(time.time() - start, 0.001)
+    click.echo('imported %s paths in %.1fs (%.0f/s)' % (imported, elapsed, imported / elapsed), err=True)
+
+
+@click.command('sync')
+@click.option('--src', '-s', required=True)
+@click.option('--dest', '-d', required=True)
+@click.option('--project', '-p', required=True)
+@click.option('--dry/--no-dry', default=False)
+@click.option('--delete/--no-delete', default=True)
+@click.option('--test-eval', required=False, callback=validate_test_eval)
+@click.option('--batch-size', type=int, default=500)
+@click.option('--max-batch-bytes', type=int, default=DEFAULT_MAX_BATCH_BYTES)
+@click.option('--retries', type=int, default=3)
+@click.option('--page-size', type=int, required=False)
+@firebase_options
+def sync_command(src, dest, project, dry, delete, test_eval, batch_size, max_batch_bytes, retries, page_size,
+                 firebase_settings):
+    firebase = get_firebase(project, **uncached(firebase_settings, 'sync'))
+
+    def print_batch(batch):
+        if batch.exception:
+            click.echo('batch %s: %s paths failed after %s attempts: %s' % (
+                batch.common or '/', len(batch), batch.attempts, batch.exception), err=True)
+
+    sync_generator = sync_values(
+        firebase, src, dest, dry=dry, test_eval=test_eval, batch_size=batch_size, max_batch_bytes=max_batch_bytes,
+        retries=retries, page_size=page_size, delete_extraneous=delete, on_batch=print_batch)
+
+    changes = 0
+    for src_path, dest_path, value in sync_generator:
+        changes += 1
+
+        if value is None:
+            click.echo('delete %s' % dest_path)
+        else:
+            click.echo('%s => %s' % (src_path, dest_path))
+
+    click.echo('%s changes' % changes, err=True)
+
+
+@click.command('watch')
+@click.option('--path', required=True, multiple=True)
+@click.option('--project', '-p', required=True)
+@firebase_options
+def watch_command(path, project, firebase_settings):
+    firebase = get_firebase(project, **firebase_settings)
+
+    def print_event(event, event_path, data):
+        click.echo(json.dumps({'event': event, 'path': event_path, 'data': data}))
+
+    watchers = []
+    for current_path in path:
+        for watched_path, _ in iterate_path(firebase, current_path, keys_only=True):
+            watchers.append(gevent.spawn(watch_node, firebase, watched_path, print_event))
+
+    click.echo('watching %s paths' % len(watchers), err=True)
+
+    gevent.joinall(watchers)
@@ -0,0 +1,372 @@
+# coding=utf-8
+import ast
+import operator
+import re
+import sys
+
+import six
+
+_number_types = six.integer_types + (float,)
+
+
+def _bool_and_number(a, b):
+    # Firebase, like content_hash, never takes true for 1, Python does
+    return isinstance(a, bool) != isinstance(b, bool) and isinstance(a, _number_types) and isinstance(b, _number_types)
+
+
+def _strict(op):
+    def compare(a, b):
+        return False if _bool_and_number(a, b) else op(a, b)
+
+    return compare
+
+
+def _eq(a, b):
+    return not _bool_and_number(a, b) and a == b
+
+
+def _in(a, b):
+    if isinstance(b, (list, tuple)):
+        return any(_eq(a, element) for element in b)
+
+    return a in b
+
+
+_compare_operators = {
+    ast.Eq: _eq,
+    ast.NotEq: lambda a, b: not _eq(a, b),
+    ast.Lt: _strict(operator.lt),
+    ast.LtE: _strict(operator.le),
+    ast.Gt: _strict(operator.gt),
+    ast.GtE: _strict(operator.ge),
+    ast.In: _in,
+    ast.NotIn: lambda a, b: not _in(a, b),
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+_name_constants = {
+    'True': True,
+    'False': False,
+    'None': None,
+}
+
+if sys.version_info >= (3, 8):
+    _constant_types = (ast.Constant,)
+else:
+    _constant_types = tuple(getattr(ast, name) for name in ('Num', 'Str', 'Bytes', 'NameConstant') if hasattr(ast, name))
+
+
+def _constant_value(node):
+    if hasattr(node, 'value'):
+        return node.value
+
+    if hasattr(node, 'n'):
+        return node.n
+
+    return node.s
+
+
+def _get_child(value, key):
+    if isinstance(value, dict):
+        return value.get(key)
+
+    if isinstance(value, list) and isinstance(key, six.integer_types) and 0 <= key < len(value):
+        return value[key]
+
+    return None
+
+
+def _exists(value):
+    return value is not None
+
+
+def _match(value, pattern):
+    if not isinstance(value, six.string_types):
+        return False
+
+    if not hasattr(pattern, 'search'):
+        pattern = re.compile(pattern)
+
+    return pattern.search(value) is not None
+
+
+def _len(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, six.string_types) else value
+
+
+def _upper(value):
+    return value.upper() if isinstance(value, six.string_types) else value
+
+
+_functions = {
+    'exists': _exists,
+    'match': _match,
+    'len': _len,
+    'lower': _lower,
+    'upper': _upper,
+    'int': int,
+    'float': float,
+    'str': str,
+}
+
+
+class PredicateError(ValueError):
+    pass
+
+
+# The bare name value, resolved per node by _resolve_value
+_VALUE = object()
+
+
+def _resolve_value(value):
+    # Expressions written for eval() read value as the node's value key, it is the node itself otherwise
+    if isinstance(value, dict) and 'value' in value:
+        return value['value']
+
+    return value
+
+
+class Predicate(object):
+    """A --test-eval expression compiled once, see README for what it can contain."""
+
+    def __init__(self, expression):
+        self.expression = expression
+
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as ex:
+            raise PredicateError('invalid expression %s: %s' % (expression, ex))
+
+        self._evaluate = self._compile(tree.body)
+        self.query = self._build_query(tree.body)
+
+    def __call__(self, value):
+        return bool(self._evaluate(value))
+
+    def __repr__(self):
+        return 'Predicate(%r)' % self.expression
+
+    def _compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            return self._compile_bool_op(node)
+
+        if isinstance(node, ast.UnaryOp):
+            return self._compile_unary_op(node)
+
+        if isinstance(node, ast.Compare):
+            return self._compile_compare(node)
+
+        if isinstance(node, ast.Call):
+            return self._compile_call(node)
+
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            elements = [self._compile(e) for e in node.elts]
+            return lambda value: [e(value) for e in elements]
+
+        if isinstance(node, ast.Name) and node.id in _name_constants:
+            constant = _name_constants[node.id]
+            return lambda value: constant
+
+        if isinstance(node, _constant_types):
+            constant = _constant_value(node)
+            return lambda value: constant
+
+        field = self._field_path(node)
+        if field is not None:
+            return self._compile_field(field)
+
+        raise PredicateError('unsupported expression: %s' % ast.dump(node))
+
+    def _compile_bool_op(self, node):
+        values = [self._compile(v) for v in node.values]
+
+        if isinstance(node.op, ast.And):
+            return lambda value: all(v(value) for v in values)
+
+        return lambda value: any(v(value) for v in values)
+
+    def _compile_unary_op(self, node):
+        operand = self._compile(node.operand)
+
+        if isinstance(node.op, ast.Not):
+            return lambda value: not operand(value)
+
+        if isinstance(node.op, ast.USub):
+            def negate(value):
+                try:
+                    return -operand(value)
+                except TypeError:
+                    return None
+
+            return negate
+
+        raise PredicateError('unsupported operator: %s' % type(node.op).__name__)
+
+    def _compile_compare(self, node):
+        left = self._compile(node.left)
+        comparisons = []
+
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _compare_operators:
+                raise PredicateError('unsupported operator: %s' % type(op).__name__)
+
+            comparisons.append((_compare_operators[type(op)], self._compile(comparator)))
+
+        def compare(value):
+            current = left(value)
+
+            for op, comparator in comparisons:
+                other = comparator(value)
+
+                try:
+                    if not op(current, other):
+                        return False
+                except TypeError:
+                    return False
+
+                current = other
+
+            return True
+
+        return compare
+
+    def _compile_call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _functions:
+            raise PredicateError('unsupported function: %s' % ast.dump(node.func))
+
+        if getattr(node, 'keywords', None):
+            raise PredicateError('keyword arguments are not supported: %s' % node.func.id)
+
+        func = _functions[node.func.id]
+        args = list(node.args)
+
+        if func is _match and len(args) == 2 and isinstance(args[1], _constant_types):
+            pattern = re.compile(_constant_value(args[1]))
+            subject = self._compile(args[0])
+            return lambda value: _match(subject(value), pattern)
+
+        compiled_args = [self._compile(a) for a in args]
+
+        def call(value):
+            try:
+                return func(*[a(value) for a in compiled_args])
+            except (TypeError, ValueError):
+                return None
+
+        return call
+
+    @classmethod
+    def _subscript_key(cls, node):
+        # Before 3.9 a slice (a[1:2]) is an ast.Slice without value
+        key = getattr(node.slice, 'value', None) if sys.version_info < (3, 9) else node.slice
+
+        if isinstance(key, _constant_types):
+            return _constant_value(key)
+
+        return None
+
+    @classmethod
+    def _field_path(cls, node):
+        if isinstance(node, ast.Name):
+            return [_VALUE] if node.id == 'value' else [node.id]
+
+        if isinstance(node, ast.Attribute):
+            parent = cls._field_path(node.value)
+            return None if parent is None else parent + [node.attr]
+
+        if isinstance(node, ast.Subscript):
+            key = cls._subscript_key(node)
+            parent = cls._field_path(node.value)
+            return None if parent is None or key is None else parent + [key]
+
+        return None
+
+    @classmethod
+    def _compile_field(cls, field):
+        if field == [_VALUE]:
+            return _resolve_value
+
+        def get_field(value):
+            for key in field:
+                value = _resolve_value(value) if key is _VALUE else _get_child(value, key)
+
+                if value is None:
+                    return None
+
+            return value
+
+        return get_field
+
+    @classmethod
+    def _query_terms(cls, node):
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            for value in node.values:
+                for term in cls._query_terms(value):
+                    yield term
+
+            return
+
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return
+
+        op = type(node.ops[0])
+        left, right = node.left, node.comparators[0]
+
+        if isinstance(left, _constant_types) and not isinstance(right, _constant_types):
+            left, right = right, left
+            op = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}.get(op, op)
+
+        field = cls._field_path(left)
+        if field is None or not isinstance(right, _constant_types):
+            return
+
+        constant = _constant_value(right)
+        # value is a child or the node itself depending on the node, no single orderBy covers both
+        if constant is None or not all(isinstance(key, six.string_types) for key in field):
+            return
+
+        order_by = '/'.join(field)
+
+        if op is ast.Eq:
+            yield order_by, 'equalTo', constant
+        elif op in (ast.Gt, ast.GtE):
+            yield order_by, 'startAt', constant
+        elif op in (ast.Lt, ast.LtE):
+            yield order_by, 'endAt', constant
+
+    @classmethod
+    def _build_query(cls, node):
+        # The query only narrows down the children to a superset of the matches,
+        # the predicate is still evaluated on every child it returns
+        query = None
+
+        for order_by, name, constant in cls._query_terms(node):
+            if query is None:
+                query = {'orderBy': order_by}
+            elif query['orderBy'] != order_by:
+                continue
+
+            if 'equalTo' in query or (name == 'equalTo' and len(query) > 1):
+                continue
+
+            if name in query:
+                continue
+
+            query[name] = constant
+
+        return query
+
+
+def compile_predicate(expression):
+    if expression is None or isinstance(expression, Predicate):
+        return expression
+
+    return Predicate(expression)
@@ -0,0 +1,69 @@
+# coding=utf-8
+import random
+import time
+
+import gevent
+
+RETRY_STATUSES = (429, 503, 504)
+
+# Every successful request earns back that much of a retry, up to the budget
+DEFAULT_BUDGET_REFILL = 0.1
+
+
+class RetryPolicy(object):
+    """Exponential backoff with jitter, a per request limit, a retry budget refilled by successes and a breaker."""
+
+    def __init__(self, base_delay=0.5, max_delay=30.0, max_attempts=8, budget=1000, breaker_threshold=20,
+                 breaker_pause=15.0, budget_refill=DEFAULT_BUDGET_REFILL):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.budget_refill = budget_refill
+        self.breaker_threshold = breaker_threshold
+        self.breaker_pause = breaker_pause
+
+        self.retries = 0
+        self.tokens = float(budget)
+        self.backoff_time = 0.0
+        self.breaker_trips = 0
+        self._consecutive_failures = 0
+        self._paused_until = 0
+
+    def wait_if_open(self):
+        delay = self._paused_until - time.time()
+
+        if delay > 0:
+            gevent.sleep(delay)
+
+    def should_retry(self, attempt):
+        return attempt < self.max_attempts and self.tokens >= 1
+
+    def sleep(self, attempt):
+        """Waits the backoff delay of attempt and returns it, without spending the retry budget."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+        gevent.sleep(delay)
+
+        return delay
+
+    def backoff(self, attempt):
+        self.retries += 1
+        self.tokens = max(self.tokens - 1, 0.0)
+        self.record_failure()
+
+        self.backoff_time += self.sleep(attempt)
+
+    def record_success(self):
+        self._consecutive_failures = 0
+        self.tokens = min(self.tokens + self.budget_refill, self.budget)
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+
+        if self._consecutive_failures < self.breaker_threshold:
+            return
+
+        self._consecutive_failures = 0
+        self._paused_until = time.time() + self.breaker_pause
+        self.breaker_trips += 1
@@ -0,0 +1,190 @@
+# coding=utf-8
+import gzip
+import io
+import json
+from collections import OrderedDict
+
+import gevent
+from gevent.queue import Queue
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from firetool_commands.base_root_core import _json_handler
+from firetool_commands.jsonstream import iterate_json_object
+
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+
+SHARD_EXTENSIONS = {
+    'none': '.ndjson',
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+}
+
+DEFAULT_MAX_SHARD_BYTES = 256 * 1024 * 1024
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+DEFAULT_MAX_PENDING_CHUNKS = 16
+
+
+def open_shard(filename, compression):
+    if compression == 'gzip':
+        return gzip.open(filename, 'wb')
+
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().stream_writer(open(filename, 'wb'))
+
+    return open(filename, 'wb')
+
+
+class NdjsonShardWriter(object):
+    """Writes {path: value} lines to rotating shards, write() blocks once max_pending_chunks are buffered."""
+
+    def __init__(self, prefix, compression='none', max_shard_bytes=DEFAULT_MAX_SHARD_BYTES,
+                 chunk_bytes=DEFAULT_CHUNK_BYTES, max_pending_chunks=DEFAULT_MAX_PENDING_CHUNKS):
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstd compression requires the zstandard package')
+
+        self._prefix = prefix
+        self._compression = compression
+        self._max_shard_bytes = max_shard_bytes
+        self._chunk_bytes = chunk_bytes
+        self._chunk = []
+        self._chunk_size = 0
+        self._queue = Queue(maxsize=max_pending_chunks)
+        self._file = None
+        self._file_bytes = 0
+        self._exception = None
+        self.shards = []
+        self.lines = 0
+        self.bytes = 0
+        self._writer = gevent.spawn(self._run)
+
+    def write(self, path, value):
+        if self._exception is not None:
+            raise self._exception
+
+        line = (json.dumps({path: value}, default=_json_handler) + '\n').encode('utf8')
+
+        self._chunk.append(line)
+        self._chunk_size += len(line)
+        self.lines += 1
+
+        if self._chunk_size >= self._chunk_bytes:
+            self._put_chunk()
+
+    def close(self):
+        self._put_chunk()
+        self._queue.put(None)
+        self._writer.join()
+
+        if self._exception is not None:
+            raise self._exception
+
+    def _put_chunk(self):
+        if not self._chunk:
+            return
+
+        self._queue.put(self._chunk)
+        self._chunk = []
+        self._chunk_size = 0
+
+    def _run(self):
+        # Compression and disk writes run in the hub's thread pool, so fetching continues while a chunk is written
+        threadpool = gevent.get_hub().threadpool
+
+        while True:
+            chunk = self._queue.get()
+
+            if chunk is None:
+                break
+
+            if self._exception is not None:
+                continue
+
+            try:
+                threadpool.apply(self._write_chunk, (chunk,))
+            except Exception as ex:
+                self._exception = ex
+
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as ex:
+                self._exception = self._exception or ex
+
+    def _write_chunk(self, chunk):
+        if self._file is None or self._file_bytes >= self._max_shard_bytes:
+            self._open_next_shard()
+
+        data = b''.join(chunk)
+        self._file.write(data)
+        self._file_bytes += len(data)
+        self.bytes += len(data)
+
+    def _open_next_shard(self):
+        if self._file is not None:
+            self._file.close()
+
+        filename = '%s-%05d%s' % (self._prefix, len(self.shards), SHARD_EXTENSIONS[self._compression])
+        self._file = open_shard(filename, self._compression)
+        self._file_bytes = 0
+        self.shards.append(filename)
+
+
+def open_shard_for_reading(filename):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+
+    if filename.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError('%s: zstd compression requires the zstandard package' % filename)
+
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb')))
+
+    return open(filename, 'rb')
+
+
+def is_json_shard(filename):
+    for extension in ('.gz', '.zst'):
+        if filename.endswith(extension):
+            filename = filename[:-len(extension)]
+
+    return filename.endswith('.json')
+
+
+def _read_json_records(filename, f, start_line, start_index):
+    # A plain JSON shard is one object on line 1, its children are parsed one at a time
+    chunks = iter(lambda: f.read(DEFAULT_CHUNK_BYTES), b'')
+
+    for index, (path, value) in enumerate(iterate_json_object(chunks)):
+        if path is None:
+            raise ValueError('%s: expected a JSON object of {path: value}' % filename)
+
+        if (1, index) < (start_line, start_index):
+            continue
+
+        yield 1, index, path, value
+
+
+def read_shard(filename, start_line=0, start_index=0):
+    """Yields (line, index, path, value) for every {path: value} record after (start_line, start_index)."""
+    with open_shard_for_reading(filename) as f:
+        if is_json_shard(filename):
+            for record in _read_json_records(filename, f, start_line, start_index):
+                yield record
+
+            return
+
+        for line_number, line in enumerate(f, 1):
+            if line_number < start_line or not line.strip():
+                continue
+
+            records = json.loads(line.decode('utf8'), object_pairs_hook=OrderedDict)
+
+            for index, (path, value) in enumerate(records.items()):
+                if (line_number, index) < (start_line, start_index):
+                    continue
+
+                yield line_number, index, path, value
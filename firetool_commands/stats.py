@@ -0,0 +1,153 @@
+# coding=utf-8
+import math
+import time
+from collections import OrderedDict
+
+import gevent
+
+# Buckets grow by 2^(1/4), percentiles are within ~10% of the exact value
+_BUCKET_BASE = 0.0005
+_BUCKET_GROWTH = 2 ** 0.25
+
+
+def _bucket_index(seconds):
+    if seconds <= _BUCKET_BASE:
+        return 0
+
+    return int(math.ceil(math.log(seconds / _BUCKET_BASE, _BUCKET_GROWTH)))
+
+
+def _bucket_upper_bound(index):
+    return _BUCKET_BASE * _BUCKET_GROWTH ** index
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = _bucket_index(seconds)
+
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+
+        rank = int(math.ceil(self.count * p / 100.0))
+        seen = 0
+
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+
+            if seen >= rank:
+                return min(_bucket_upper_bound(index), self.max)
+
+        return self.max
+
+
+class MethodStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.errors = OrderedDict()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        return OrderedDict([
+            ('requests', self.requests),
+            ('errors', self.errors),
+            ('bytes_in', self.bytes_in),
+            ('bytes_out', self.bytes_out),
+            ('latency_mean', self.latency.total / self.latency.count if self.latency.count else None),
+            ('latency_p50', self.latency.percentile(50)),
+            ('latency_p95', self.latency.percentile(95)),
+            ('latency_p99', self.latency.percentile(99)),
+            ('latency_max', self.latency.max),
+        ])
+
+
+class RunStats(object):
+    """Requests, bytes, errors and latency of every request attempt, per HTTP method."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.methods = OrderedDict()
+
+    def record(self, method, latency, bytes_out=0, bytes_in=0, status=None, error=None):
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+
+        stats.requests += 1
+        stats.bytes_out += bytes_out
+        stats.bytes_in += bytes_in
+        stats.latency.add(latency)
+
+        if error is None and status is not None and status >= 400:
+            error = str(status)
+
+        if error is not None:
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+
+    def to_dict(self, retry_policy=None):
+        data = OrderedDict([
+            ('elapsed', time.time() - self.started),
+            ('methods', OrderedDict((method, stats.to_dict()) for method, stats in self.methods.items())),
+        ])
+
+        if retry_policy is not None:
+            data['retries'] = retry_policy.retries
+            data['backoff_time'] = retry_policy.backoff_time
+            data['breaker_trips'] = retry_policy.breaker_trips
+
+        return data
+
+
+def format_bytes(size):
+    if size < 1024:
+        return '%dB' % size
+
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024.0
+
+        if size < 1024 or unit == 'GB':
+            return '%.1f%s' % (size, unit)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+
+    if seconds < 1:
+        return '%dms' % round(seconds * 1000)
+
+    return '%.1fs' % seconds
+
+
+def format_stats(stats):
+    elapsed = max(time.time() - stats.started, 0.001)
+
+    for method, method_stats in stats.methods.items():
+        latency = method_stats.latency
+        errors = sum(method_stats.errors.values())
+
+        yield '%s: %s requests (%.1f/s), %s errors, in %s (%s/s), out %s, latency p50 %s p95 %s p99 %s max %s' % (
+            method, method_stats.requests, method_stats.requests / elapsed, errors,
+            format_bytes(method_stats.bytes_in), format_bytes(method_stats.bytes_in / elapsed),
+            format_bytes(method_stats.bytes_out), format_seconds(latency.percentile(50)),
+            format_seconds(latency.percentile(95)), format_seconds(latency.percentile(99)),
+            format_seconds(latency.max))
+
+
+def dump_metrics_periodically(get_metrics, write, interval):
+    while True:
+        gevent.sleep(interval)
+        write(get_metrics())
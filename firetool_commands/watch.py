@@ -0,0 +1,150 @@
+# coding=utf-8
+import json
+import logging
+
+import requests
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from firetool_commands.diff import diff_values
+
+# Firebase sends a keep-alive event every 30 seconds, a silent connection is dead
+STREAM_READ_TIMEOUT = 90
+
+
+def parse_event_stream(chunks):
+    """Yields (event, data) for every event of a text/event-stream."""
+    partial = []
+    event = None
+    data = []
+
+    for chunk in chunks:
+        if b'\n' not in chunk:
+            partial.append(chunk)
+            continue
+
+        partial.append(chunk)
+        lines = b''.join(partial).split(b'\n')
+        partial = [lines.pop()]
+
+        for line in lines:
+            line = line.rstrip(b'\r').decode('utf8')
+
+            if not line:
+                if event is not None or data:
+                    yield event or 'message', '\n'.join(data)
+
+                event, data = None, []
+                continue
+
+            if line.startswith(':'):
+                continue
+
+            field, _, value = line.partition(':')
+            if value.startswith(' '):
+                value = value[1:]
+
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+
+
+def join_event_path(path, event_path):
+    if event_path in ('', '/'):
+        return path
+
+    return path.rstrip('/') + '/' + event_path.strip('/')
+
+
+def set_path(tree, keys, value):
+    if not keys:
+        return value
+
+    if not isinstance(tree, dict):
+        tree = {}
+
+    child = set_path(tree.get(keys[0]), keys[1:], value)
+
+    if child is None:
+        tree.pop(keys[0], None)
+    else:
+        tree[keys[0]] = child
+
+    return tree or None
+
+
+def apply_event(tree, event, event_path, data):
+    keys = [key for key in event_path.split('/') if key]
+
+    if event == 'put':
+        return set_path(tree, keys, data)
+
+    for key, value in (data or {}).items():
+        tree = set_path(tree, keys + [key for key in key.split('/') if key], value)
+
+    return tree
+
+
+def watch_node(firebase_root, path, emit, read_timeout=STREAM_READ_TIMEOUT):
+    """Emits (event, path, data) for every change of path, reconnecting until the stream is cancelled."""
+    tree = None
+    connected_before = False
+    attempt = 0
+
+    while True:
+        try:
+            response = firebase_root.stream(path, timeout=read_timeout)
+            resumed = connected_before
+            connected_before = True
+
+            try:
+                for event, data in parse_event_stream(response.iter_content(chunk_size=None)):
+                    attempt = 0
+
+                    if event == 'keep-alive':
+                        continue
+
+                    if event == 'cancel':
+                        emit('cancel', path, data)
+                        return
+
+                    if event == 'auth_revoked':
+                        logging.info('%s: credentials expired, reconnecting', path)
+                        break
+
+                    if event not in ('put', 'patch'):
+                        continue
+
+                    message = json.loads(data)
+
+                    if resumed and event == 'put' and message['path'] == '/':
+                        # A new connection starts with the whole node, only report what changed while disconnected
+                        for change_path, value in diff_values(path, message['data'], tree):
+                            emit('put', change_path, value)
+
+                        tree = message['data']
+                        resumed = False
+                        continue
+
+                    tree = apply_event(tree, event, message['path'], message['data'])
+                    emit(event, join_event_path(path, message['path']), message['data'])
+            finally:
+                response.close()
+        except httplib.HTTPException as ex:
+            content, r = ex.args
+
+            if r.status not in (401, 429, 500, 502, 503, 504):
+                emit('cancel', path, content.decode('utf8') if isinstance(content, bytes) else content)
+                return
+
+            logging.warning('%s: stream failed %s, reconnecting', path, r.status)
+        except (requests.exceptions.RequestException, ValueError) as ex:
+            logging.warning('%s: stream failed %s, reconnecting', path, ex)
+
+        # A watch reconnects for as long as it runs, it does not spend the retry budget of the requests
+        attempt += 1
+        firebase_root.retry_policy.sleep(attempt)
@@ -0,0 +1,106 @@
+# coding=utf-8
+import os
+import sys
+
+from gevent import monkey
+
+monkey.patch_all()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import gevent  # noqa: E402
+import pytest  # noqa: E402
+
+from fake_firebase import FakeFirebase, serve  # noqa: E402
+from firetool_commands.cache import DiskCache  # noqa: E402
+from firetool_commands.common import PlainFirebaseRoot  # noqa: E402
+from firetool_commands.retry import RetryPolicy  # noqa: E402
+
+
+@pytest.fixture
+def firebase():
+    """Returns make(data, **fake_options) -> (fake, root) served by the in-process Firebase stand-in, wrap(fake)."""
+    servers = []
+
+    def make(data=None, pool_size=10, cache_dir=None, wrap=None, **kwargs):
+        fake = FakeFirebase(data, seed=0, **kwargs)
+        server, url = serve(wrap(fake) if wrap else fake)
+        servers.append(server)
+
+        root = PlainFirebaseRoot(
+            url, pool_size=pool_size, retry_policy=RetryPolicy(base_delay=0.01, max_delay=0.05),
+            cache=DiskCache(url, cache_dir=cache_dir) if cache_dir else None)
+
+        return fake, root
+
+    yield make
+
+    for server in servers:
+        server.stop()
+
+
+def _failing(times, status='504 Gateway Timeout', when=lambda environ: True):
+    """Wraps the fake, the first times requests matching when fail with status."""
+    def wrap(fake):
+        left = [times]
+
+        def app(environ, start_response):
+            if left[0] > 0 and when(environ):
+                left[0] -= 1
+                method = environ['REQUEST_METHOD']
+                fake.requests += 1
+                fake.methods[method] = fake.methods.get(method, 0) + 1
+                return fake._respond(start_response, status, {'error': status})
+
+            return fake(environ, start_response)
+
+        return app
+
+    return wrap
+
+
+def _slow(times, delay):
+    """Wraps the fake, the first times requests are answered after delay."""
+    def wrap(fake):
+        left = [times]
+
+        def app(environ, start_response):
+            if left[0] > 0:
+                left[0] -= 1
+                gevent.sleep(delay)
+
+            return fake(environ, start_response)
+
+        return app
+
+    return wrap
+
+
+def _recording(queries):
+    """Wraps the fake, appends the query string of every request to queries."""
+    def wrap(fake):
+        def app(environ, start_response):
+            queries.append(environ.get('QUERY_STRING', ''))
+            return fake(environ, start_response)
+
+        return app
+
+    return wrap
+
+
+@pytest.fixture
+def failing():
+    return _failing
+
+
+@pytest.fixture
+def slow():
+    return _slow
+
+
+@pytest.fixture
+def recording():
+    return _recording
@@ -0,0 +1,118 @@
+# coding=utf-8
+from firetool_commands.batch import MultiPatchBatch, MultiPatchWriter
+
+
+def test_overlaps():
+    batch = MultiPatchBatch()
+    batch.add('a/b', 1, 1)
+
+    assert batch.overlaps('a/b')
+    assert batch.overlaps('a')
+    assert batch.overlaps('a/b/c')
+    assert not batch.overlaps('a/c')
+    assert not batch.overlaps('a/bc')
+
+
+def test_batches_share_the_common_root(firebase):
+    fake, root = firebase({'k': {'x': 0}})
+
+    writer = MultiPatchWriter(root, max_items=2)
+    writer.add('k/x', 1)
+    writer.add('k/y', 2)
+    writer.add('k/z', 3)
+    batches = writer.flush()
+
+    assert [batch.common for batch in batches] == ['k', 'k']
+    assert fake.data == {'k': {'x': 1, 'y': 2, 'z': 3}}
+
+
+def test_later_write_to_the_same_path_wins(firebase):
+    fake, root = firebase({}, jitter=0.01)
+
+    for _ in range(20):
+        writer = MultiPatchWriter(root, max_items=1, max_pending=10)
+        writer.add('k/x', 'old')
+        writer.add('k/y', 1)
+        writer.add('k/x', 'new')
+        writer.flush()
+
+        assert fake.data['k']['x'] == 'new'
+
+
+def test_batches_are_split_by_size(firebase):
+    fake, root = firebase({})
+
+    writer = MultiPatchWriter(root, max_items=100, max_bytes=50)
+    batches = []
+    for i in range(6):
+        batches.extend(writer.add('k/%d' % i, 'x' * 20))
+    batches.extend(writer.flush())
+
+    assert [len(batch) for batch in batches] == [2, 2, 2]
+    assert fake.data == {'k': dict((str(i), 'x' * 20) for i in range(6))}
+
+
+def test_dry_run_writes_nothing(firebase):
+    fake, root = firebase({'k': {'x': 0}})
+
+    writer = MultiPatchWriter(root, dry=True)
+    writer.add('k/x', None)
+    batches = writer.flush()
+
+    assert len(batches) == 1 and batches[0].exception is None
+    assert fake.data == {'k': {'x': 0}}
+
+
+def is_patch(environ):
+    return environ['REQUEST_METHOD'] == 'PATCH'
+
+
+def test_failed_batch_reports_its_exception(firebase, failing):
+    fake, root = firebase({}, wrap=failing(1000, '400 Bad Request', when=is_patch))
+
+    writer = MultiPatchWriter(root, retries=2)
+    writer.add('k/x', 1)
+    batches = writer.flush()
+
+    assert batches[0].exception is not None
+    # a 400 is not retried
+    assert batches[0].attempts == 1
+    assert fake.data == {}
+
+
+def test_unavailable_batch_is_retried(firebase, failing):
+    fake, root = firebase({}, wrap=failing(3, '503 Service Unavailable', when=is_patch))
+
+    writer = MultiPatchWriter(root, retries=3)
+    writer.add('k/x', 1)
+    batches = writer.flush()
+
+    assert batches[0].exception is None
+    # one request per attempt
+    assert batches[0].attempts == 4
+    assert fake.methods['PATCH'] == 4
+    assert fake.data == {'k': {'x': 1}}
+
+
+def test_no_retries_sends_one_request(firebase, failing):
+    fake, root = firebase({}, wrap=failing(1000, '503 Service Unavailable', when=is_patch))
+
+    writer = MultiPatchWriter(root, retries=0)
+    writer.add('k/x', 1)
+    batches = writer.flush()
+
+    assert batches[0].exception is not None
+    assert batches[0].attempts == 1
+    assert fake.methods['PATCH'] == 1
+
+
+def test_without_retries_the_policy_limits_the_attempts(firebase, failing):
+    fake, root = firebase({}, wrap=failing(1000, '503 Service Unavailable', when=is_patch))
+    root.retry_policy.max_attempts = 3
+
+    writer = MultiPatchWriter(root)
+    writer.add('k/x', 1)
+    batches = writer.flush()
+
+    assert batches[0].attempts == 3
+    assert fake.methods['PATCH'] == 3
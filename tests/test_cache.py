@@ -0,0 +1,27 @@
+# coding=utf-8
+from firetool_commands.operations import uncached
+
+
+def test_get_and_get_tree_share_cached_responses(firebase, tmpdir):
+    fake, root = firebase({'a': {'b': 1}}, cache_dir=str(tmpdir))
+
+    assert root.get_tree('a') == {'b': 1}
+    assert root.get('a') == {'b': 1}
+    assert fake.requests == 1
+
+
+def test_first_write_clears_the_cache(firebase, tmpdir):
+    fake, root = firebase({'a': {'b': 1}}, cache_dir=str(tmpdir))
+
+    root.get('a')
+    root.put('a/b', 2)
+
+    assert root.get('a') == {'b': 2}
+
+
+def test_writing_commands_do_not_read_the_cache():
+    settings = uncached({'concurrency': 5, 'cache': True}, 'delete')
+
+    assert settings['cache'] is False
+    assert settings['clear_cache'] is True
+    assert settings['concurrency'] == 5
@@ -0,0 +1,36 @@
+# coding=utf-8
+import pytest
+
+from firetool_commands.checkpoint import Checkpoint
+
+
+def test_windows_are_in_natural_key_order(firebase, tmpdir):
+    fake, root = firebase({'days': dict(('k%d' % i, i) for i in range(1, 6)), 'other': 1})
+    checkpoint = Checkpoint(str(tmpdir.join('state')))
+
+    assert list(checkpoint.windows(root, 'days/(.*)', size=2)) == [['k1', 'k2'], ['k3', 'k4'], ['k5']]
+    assert checkpoint.completed('days/(.*)') == 5
+
+
+def test_resumes_after_the_completed_windows(firebase, tmpdir):
+    fake, root = firebase({'days': dict(('k%d' % i, i) for i in range(1, 6))})
+    filename = str(tmpdir.join('state'))
+
+    windows = Checkpoint(filename).windows(root, 'days/(.*)', size=2)
+    assert next(windows) == ['k1', 'k2']
+    # the second window is handed out but never completed
+    assert next(windows) == ['k3', 'k4']
+
+    # keys added after the first run are not picked up, the key list was saved
+    fake.data['days']['k0'] = 0
+
+    checkpoint = Checkpoint(filename)
+    assert checkpoint.completed('days/(.*)') == 2
+    assert list(checkpoint.windows(root, 'days/(.*)', size=2)) == [['k3', 'k4'], ['k5']]
+
+
+def test_needs_a_wildcard_after_the_first_element(firebase, tmpdir):
+    fake, root = firebase({'days': {'a': 1}})
+
+    with pytest.raises(ValueError):
+        list(Checkpoint(str(tmpdir.join('state'))).windows(root, 'days/a'))
@@ -0,0 +1,86 @@
+# coding=utf-8
+import gevent
+import pytest
+import requests
+
+from firetool_commands.common import PlainFirebaseRoot
+from firetool_commands.concurrency import AdaptiveLimiter
+
+
+def test_acquire_waits_for_a_release():
+    limiter = AdaptiveLimiter(10, initial_limit=1)
+    limiter.acquire()
+
+    waiting = gevent.spawn(limiter.acquire)
+    gevent.sleep(0.01)
+    assert not waiting.ready()
+
+    limiter.release()
+    waiting.join(timeout=1)
+    assert waiting.ready()
+    assert limiter.in_flight == 1
+
+
+def test_overload_halves_the_limit_once_per_cooldown():
+    limiter = AdaptiveLimiter(100, initial_limit=40, cooldown=60)
+
+    limiter.acquire()
+    limiter.release(overloaded=True)
+    assert limiter.limit == 20
+
+    limiter.acquire()
+    limiter.release(overloaded=True)
+    assert limiter.limit == 20
+    assert limiter.decreases == 1
+
+
+def test_limit_never_goes_under_the_minimum():
+    limiter = AdaptiveLimiter(100, min_limit=3, initial_limit=4, cooldown=0)
+
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(overloaded=True)
+
+    assert limiter.limit == 3
+
+
+def test_limit_grows_additively_up_to_the_maximum():
+    limiter = AdaptiveLimiter(5, initial_limit=4)
+
+    limiter.acquire()
+    limiter.release(latency=0.1)
+    assert limiter.limit == 4.25
+
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 5
+
+
+def test_slow_responses_decrease_the_limit():
+    limiter = AdaptiveLimiter(100, initial_limit=40, cooldown=0)
+
+    limiter.acquire()
+    limiter.release(latency=0.1)
+    limiter.acquire()
+    limiter.release(latency=1.0)
+
+    assert limiter.limit == pytest.approx(20.0125)
+
+
+def test_failed_request_releases_its_slot(firebase, monkeypatch):
+    fake, root = firebase({'a': 1})
+    root = PlainFirebaseRoot(root.firebase_root(), pool_size=4, adaptive=True)
+
+    def broken_body(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError('connection broken')
+
+    monkeypatch.setattr(root._requests_wrapper._session, 'request', broken_body)
+
+    # A leaked slot would make the fifth request wait forever
+    with gevent.Timeout(5):
+        for _ in range(5):
+            with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                root.get('a')
+
+    assert root.limiter.in_flight == 0
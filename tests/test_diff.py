@@ -0,0 +1,30 @@
+# coding=utf-8
+from firetool_commands.diff import content_hash, diff_values
+
+
+def test_identical_trees_have_no_changes():
+    assert list(diff_values('a', {'x': {'y': 1}}, {'x': {'y': 1}})) == []
+
+
+def test_changes_added_and_removed_keys():
+    src = {'x': 1, 'y': {'z': 2}, 'new': 3}
+    dest = {'x': 2, 'y': {'z': 2, 'old': 4}, 'gone': 5}
+
+    assert sorted(diff_values('a', src, dest), key=lambda change: change[0]) == [
+        ('a/gone', None), ('a/new', 3), ('a/x', 1), ('a/y/old', None)]
+
+
+def test_values_of_different_types_differ():
+    assert list(diff_values('a', True, 1)) == [('a', True)]
+    assert list(diff_values('a', 1, 1.5)) == [('a', 1)]
+    assert list(diff_values('a', {'x': 1}, 'x')) == [('a', {'x': 1})]
+
+
+def test_empty_object_is_null():
+    assert list(diff_values('a', {}, None)) == []
+    assert list(diff_values('a', None, {'x': 1})) == [('a', None)]
+
+
+def test_hash_ignores_key_order():
+    assert content_hash({'a': 1, 'b': 2}) == content_hash({'b': 2, 'a': 1})
+    assert content_hash(True) != content_hash(1)
@@ -0,0 +1,66 @@
+# coding=utf-8
+import pytest
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+
+def test_get_put_patch_delete(firebase):
+    fake, root = firebase({'a': {'b': 1}})
+
+    assert root.get('a') == {'b': 1}
+    assert root.get('a', shallow=True) == {'b': True}
+
+    root.put('a/c', {'d': 2})
+    root.multi_patch('a', {'b': None, 'c/e': 3})
+    assert fake.data == {'a': {'c': {'d': 2, 'e': 3}}}
+
+    root.delete('a/c')
+    # objects left without children disappear
+    assert fake.data == {}
+    assert root.get('a') is None
+
+
+def test_key_queries(firebase):
+    fake, root = firebase({'a': dict((key, 1) for key in ['b', 'a', '10', '2', '-1'])})
+
+    def keys(**params):
+        return sorted(root.get('a', orderBy='$key', **params))
+
+    # Integer keys sort first, in numeric order
+    assert keys(startAt='2', endAt='a') == ['10', '2', 'a']
+    assert keys(limitToFirst=2) == ['-1', '2']
+    assert keys(limitToLast=2) == ['a', 'b']
+
+
+def test_child_queries_need_an_index(firebase):
+    fake, root = firebase({'a': {'x': {'n': 1}, 'y': {'n': 2}, 'z': {'n': 3}}}, indexes=['n'])
+
+    assert sorted(root.get('a', orderBy='n', startAt=2)) == ['y', 'z']
+    assert sorted(root.get('a', orderBy='n', equalTo=1)) == ['x']
+
+    with pytest.raises(httplib.HTTPException):
+        root.get('a', orderBy='m', startAt=2)
+
+
+def test_overlapping_patch_is_rejected(firebase):
+    fake, root = firebase({})
+
+    with pytest.raises(httplib.HTTPException):
+        root.multi_patch('a', {'b': 1, 'b/c': 2})
+
+    assert fake.data == {}
+
+
+def test_response_size_limit(firebase):
+    fake, root = firebase({'a': {'b': 'x' * 100, 'c': 1}}, max_response_bytes=50)
+
+    assert root.get('a/c') == 1
+
+    with pytest.raises(httplib.HTTPException) as ex:
+        root.get('a')
+
+    assert b'exceeds the maximum size' in ex.value.args[0]
+    assert fake.methods['GET'] == 2
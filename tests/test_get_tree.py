@@ -0,0 +1,54 @@
+# coding=utf-8
+import logging
+
+import pytest
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from firetool_commands.operations import list_values
+
+
+def tree(size):
+    return dict(('k%03d' % i, {'value': 'x' * 50}) for i in range(size))
+
+
+def test_oversized_node_is_split_without_errors(firebase, caplog):
+    fake, root = firebase({'a': tree(20)}, max_response_bytes=500)
+
+    with caplog.at_level(logging.INFO):
+        assert root.get_tree('a') == tree(20)
+
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+
+def test_single_504_is_retried_instead_of_split(firebase, failing):
+    fake, root = firebase({'a': tree(5)}, wrap=failing(1))
+
+    assert root.get_tree('a') == tree(5)
+    assert fake.requests == 2
+
+
+def test_repeated_504_splits(firebase, failing):
+    fake, root = firebase({'a': tree(5)}, wrap=failing(2))
+
+    assert root.get_tree('a') == tree(5)
+    # two failed attempts, the shallow listing and one GET per child
+    assert fake.requests == 2 + 1 + 5
+
+
+def test_read_timeout_is_retried_for_plain_gets(firebase, slow):
+    fake, root = firebase({'a': 1}, wrap=slow(1, 0.5))
+    root.http.timeout = 0.1
+
+    assert root.get('a') == 1
+
+
+def test_failed_listing_is_raised(firebase, failing):
+    fake, root = firebase({'a': tree(5)}, wrap=failing(
+        100, status='401 Unauthorized', when=lambda environ: 'shallow' in environ.get('QUERY_STRING', '')))
+
+    with pytest.raises(httplib.HTTPException):
+        list(list_values(root, 'a/(.*)'))
@@ -0,0 +1,85 @@
+# coding=utf-8
+import gzip
+import json
+
+import pytest
+
+from firetool_commands import shards
+from firetool_commands.common import compile_path, match_path
+from firetool_commands.operations import import_values, read_import_records
+from firetool_commands.shards import read_shard
+
+
+def write_ndjson(tmpdir, records):
+    filename = str(tmpdir.join('records.ndjson'))
+
+    with open(filename, 'w') as f:
+        for path, value in records:
+            f.write(json.dumps({path: value}) + '\n')
+
+    return filename
+
+
+def test_match_path():
+    start_path, steps = compile_path(r'users/(\d+)/{name,age}')
+
+    assert match_path(start_path, steps, 'users/12/name') == ['12']
+    assert match_path(start_path, steps, 'users/12/email') is None
+    assert match_path(start_path, steps, 'users/12/name/first') is None
+    assert match_path(start_path, steps, 'people/12/name') is None
+
+    start_path, steps = compile_path('a/(.*)/b/(.*)')
+    assert match_path(start_path, steps, 'a/x/b/y') == ['x', 'y']
+    assert match_path(start_path, steps, 'a/x/c/y') is None
+
+
+def test_src_wildcard_matches_one_key(tmpdir):
+    filename = write_ndjson(tmpdir, [('users/1', 1), ('users/2/name', 2), ('users/{3}', 3), ('other/4', 4)])
+
+    records = list(read_import_records([filename], 'users/(.*)', r'people/\1'))
+
+    assert [(path, dest) for _, path, dest, _ in records] == [('users/1', 'people/1'), ('users/{3}', 'people/{3}')]
+
+
+def test_src_group_element(tmpdir):
+    filename = write_ndjson(tmpdir, [('users/a', 1), ('users/b', 2), ('users/c', 3)])
+
+    records = list(read_import_records([filename], 'users/{a,c}'))
+
+    assert [path for _, path, _, _ in records] == ['users/a', 'users/c']
+
+
+def test_import_rewrites_paths(firebase, tmpdir):
+    fake, root = firebase({})
+    filename = write_ndjson(tmpdir, [('users/1', {'name': 'a'}), ('users/1/name', 'skipped'), ('users/2', 2)])
+
+    list(import_values(root, [filename], r'users/(\d+)', r'people/\1'))
+
+    assert fake.data == {'people': {'1': {'name': 'a'}, '2': 2}}
+
+
+@pytest.mark.parametrize('name', ['records.json', 'records.json.gz'])
+def test_json_shards_are_read_in_chunks(tmpdir, monkeypatch, name):
+    monkeypatch.setattr(shards, 'DEFAULT_CHUNK_BYTES', 16)
+    records = dict(('a/%d' % i, {'value': 'x' * i}) for i in range(20))
+    filename = str(tmpdir.join(name))
+
+    with (gzip.open if name.endswith('.gz') else open)(filename, 'wb') as f:
+        f.write(json.dumps(records).encode('utf8'))
+
+    read = list(read_shard(filename))
+    assert dict((path, value) for _, _, path, value in read) == records
+    assert [(line, index) for line, index, _, _ in read] == [(1, i) for i in range(20)]
+
+    # resuming after the 5th record
+    assert [index for _, index, _, _ in read_shard(filename, 1, 5)] == list(range(5, 20))
+
+
+def test_json_shard_must_be_an_object(tmpdir):
+    filename = str(tmpdir.join('records.json'))
+
+    with open(filename, 'w') as f:
+        f.write('[1, 2]')
+
+    with pytest.raises(ValueError):
+        list(read_shard(filename))
@@ -0,0 +1,87 @@
+# coding=utf-8
+import pytest
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from firetool_commands.common import iterate_path
+
+
+def test_wildcards_groups_and_progress(firebase):
+    fake, root = firebase({'a': {'k1': {'b': {'x': 1, 'y': 2}}, 'k2': {'b': {'x': 3}}, 'j': {'b': {'x': 4}}}})
+
+    results = [(path, match.all_groups(), match.progress()) for path, match in iterate_path(root, 'a/(k.*)/b/(.*)')]
+
+    # Paths come out as their listings complete
+    assert sorted(results) == [
+        ('a/k1/b/x', ['k1', 'x'], '1/2 1/2'),
+        ('a/k1/b/y', ['k1', 'y'], '1/2 2/2'),
+        ('a/k2/b/x', ['k2', 'x'], '2/2 1/1'),
+    ]
+
+
+def test_group_elements(firebase):
+    fake, root = firebase({'a': {'k1': {'b': 1}, 'k2': {'b': 2}}})
+
+    assert sorted(path for path, _ in iterate_path(root, 'a/{k1,k2}/b')) == ['a/k1/b', 'a/k2/b']
+    assert [path for path, _ in iterate_path(root, 'a/{k1,k2}')] == ['a/{k1,k2}']
+    assert sorted(path for path, _ in iterate_path(root, 'a/{k1,k2}', keys_only=True)) == ['a/k1', 'a/k2']
+
+
+def test_test_eval_results_stream_while_the_tree_is_listed(firebase):
+    fake, root = firebase({'a': dict(('k%d' % i, {'b': {'x': i}}) for i in range(200))}, pool_size=5)
+
+    results = iterate_path(root, 'a/(.*)/b', test_eval='x >= 0')
+    next(results)
+    requests_at_first_result = fake.requests
+
+    assert len(list(results)) == 199
+    assert requests_at_first_result < fake.requests / 2
+
+
+def test_test_eval_fetch_failures_are_raised(firebase):
+    fake, root = firebase({'a': {'k1': {'x': 'y' * 1000}}}, max_response_bytes=500)
+
+    with pytest.raises(httplib.HTTPException):
+        list(iterate_path(root, 'a/(.*)', test_eval='x == 1'))
+
+
+# Integer keys come first in numeric order, then the strings, like orderBy="$key" sorts them
+PAGED_KEYS = ['-3', '1', '2', '10', '2147483647', '2017-01-01', '2017-02-01', '2017-02-15', '2147483648', 'a', 'b']
+
+
+@pytest.mark.parametrize('page_size', [1, 3, len(PAGED_KEYS), 50])
+@pytest.mark.parametrize('descending_order', [False, True])
+def test_pages(firebase, page_size, descending_order):
+    fake, root = firebase({'a': dict((key, {'v': key}) for key in PAGED_KEYS), 'other': 1})
+
+    results = list(iterate_path(
+        root, 'a/(.*)', page_size=page_size, descending_order=descending_order, with_values=True))
+
+    expected = list(reversed(PAGED_KEYS)) if descending_order else PAGED_KEYS
+    assert [path for path, _, _ in results] == ['a/' + key for key in expected]
+    assert [value for _, _, value in results] == [{'v': key} for key in expected]
+    # a full last page is followed by one that only holds the boundary key
+    assert fake.requests == len(PAGED_KEYS) // page_size + 1
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 50])
+@pytest.mark.parametrize('descending_order', [False, True])
+def test_pages_of_an_anchored_range(firebase, page_size, descending_order):
+    fake, root = firebase({'a': dict((key, 1) for key in PAGED_KEYS)})
+
+    results = [path for path, _ in iterate_path(
+        root, 'a/(^2017-02)', page_size=page_size, descending_order=descending_order)]
+
+    expected = ['a/2017-02-01', 'a/2017-02-15']
+    assert results == (list(reversed(expected)) if descending_order else expected)
+
+
+def test_pages_below_a_wildcard(firebase):
+    fake, root = firebase({'a': {'x': {'k1': 1, 'k2': 2, 'k3': 3}, 'y': {'k4': 4}}})
+
+    results = sorted(path for path, _ in iterate_path(root, 'a/(.*)/(.*)', page_size=2))
+
+    assert results == ['a/x/k1', 'a/x/k2', 'a/x/k3', 'a/y/k4']
@@ -0,0 +1,47 @@
+# coding=utf-8
+import json
+
+import pytest
+
+from firetool_commands.jsonstream import iterate_json_object
+
+
+def chunks(data, size):
+    data = data.encode('utf8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+DOCUMENT = {'a': 1, 'b': {'c': [1, 2.5, None, True]}, u'é': u'ünïcode', 'd': 1234567890}
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+def test_children_across_chunk_boundaries(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=1)
+
+    assert dict(iterate_json_object(chunks(text, size))) == DOCUMENT
+
+
+def test_children_come_in_document_order():
+    text = '{"z": 1, "a": 2, "m": 3}'
+
+    assert [key for key, _ in iterate_json_object(chunks(text, 4))] == ['z', 'a', 'm']
+
+
+def test_number_split_at_the_end_of_a_chunk():
+    assert list(iterate_json_object([b'{"a": 12', b'34}'])) == [('a', 1234)]
+    assert list(iterate_json_object([b'12', b'34'])) == [(None, 1234)]
+
+
+def test_scalars_and_empty_documents():
+    assert list(iterate_json_object([b'null'])) == [(None, None)]
+    assert list(iterate_json_object([b' [1, 2] '])) == [(None, [1, 2])]
+    assert list(iterate_json_object([b'{}'])) == []
+    assert list(iterate_json_object([b''])) == []
+
+
+def test_truncated_object_raises():
+    with pytest.raises(ValueError):
+        list(iterate_json_object([b'{"a": 1, "b": ']))
+
+    with pytest.raises(ValueError):
+        list(iterate_json_object([b'{"a": 1']))
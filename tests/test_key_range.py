@@ -0,0 +1,66 @@
+# coding=utf-8
+import re
+
+import pytest
+
+from firetool_commands.common import key_range, KEY_RANGE_END
+from firetool_commands.operations import list_values
+
+
+def test_anchored_prefix():
+    assert key_range('^abc') == ('abc', 'abc' + KEY_RANGE_END)
+    assert key_range('^ab.*') == ('ab', 'ab' + KEY_RANGE_END)
+
+
+def test_character_class_after_the_prefix():
+    assert key_range(r'^2017-0[1-3]-\d\d') == ('2017-01', '2017-03' + KEY_RANGE_END)
+    assert key_range('^(a|b)') == ('a', 'b' + KEY_RANGE_END)
+
+
+def test_prefix_stops_at_a_group_that_stops_early():
+    assert key_range(r'(^day-(\d+)-end)') == ('day-', 'day-' + KEY_RANGE_END)
+    assert key_range('(^a(b?)c)') == ('a', 'a' + KEY_RANGE_END)
+    assert key_range('(^(ab|cd)x)') is None
+    assert key_range('(^ab(cd)e)') == ('abcde', 'abcde' + KEY_RANGE_END)
+
+
+def test_no_range():
+    assert key_range('abc') is None
+    assert key_range('^(?i)ab') is None
+    # 32-bit integer keys are ordered as numbers, before the strings
+    assert key_range('^1') is None
+
+
+def test_range_read_returns_what_the_regex_matches(firebase):
+    days = dict(('2017-%02d-%02d' % (month, day), day) for month in range(1, 13) for day in range(1, 4))
+    days.update({'5': 1, '2017': 2, '2017-02': 3})
+    fake, root = firebase({'days': days})
+
+    pattern = r'(^2017-0[2-3]-\d\d)'
+    paths = sorted(result[0] for result in list_values(root, 'days/' + pattern))
+
+    assert paths == sorted('days/' + key for key in days if re.match(pattern, key))
+    assert len(paths) == 6
+
+
+@pytest.mark.parametrize('pattern, keys', [
+    (r'(^day-(\d+)-end)', ['day-1-end', 'day-22-end', 'day--end', 'day-x-end', 'days', 'day-1-endx']),
+    ('(^a(b?)c)', ['ac', 'abc', 'abbc', 'ab', 'b', 'acx']),
+    ('(^(ab|cd)x)', ['abx', 'cdx', 'x', 'ab', 'cdxy', '1']),
+])
+def test_range_read_with_nested_groups(firebase, pattern, keys):
+    fake, root = firebase({'k': dict((key, 1) for key in keys)})
+
+    paths = sorted(result[0] for result in list_values(root, 'k/' + pattern))
+
+    assert paths == sorted('k/' + key for key in keys if re.search(pattern, key))
+
+
+def test_shallow_listing_does_not_read_the_range(firebase, recording):
+    queries = []
+    fake, root = firebase({'days': {'2017-01-01': {'big': 1}, '2017-05-01': 2}}, wrap=recording(queries))
+
+    results = list(list_values(root, r'days/(^2017-0[1-3]-\d\d)', shallow=True))
+
+    assert [(path, value) for path, _, value in results] == [('days/2017-01-01', {})]
+    assert queries == ['shallow=true']
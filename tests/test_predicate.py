@@ -0,0 +1,104 @@
+# coding=utf-8
+import pytest
+
+from firetool_commands.operations import list_values
+from firetool_commands.predicate import Predicate, PredicateError
+
+
+def test_value_is_the_value_key_of_a_dict_node():
+    assert Predicate('value > 1')({'value': 2})
+    assert not Predicate('value > 1')({'value': 0, 'other': 5})
+    assert Predicate('value.a == 1')({'value': {'a': 1}})
+
+
+def test_value_is_the_node_itself_otherwise():
+    assert Predicate('value > 1')(2)
+    assert Predicate("value == 'x'")('x')
+    assert Predicate('len(value) == 2')({'a': 1, 'b': 2})
+
+
+def test_value_is_not_pushed_down_as_a_query():
+    assert Predicate('value >= 1').query is None
+    assert Predicate('id >= 1').query == {'orderBy': 'id', 'startAt': 1}
+
+
+def test_slices_are_rejected():
+    with pytest.raises(PredicateError):
+        Predicate('a[1:2] == 1')
+
+
+def test_field_access_and_missing_keys():
+    node = {'a': {'b': 1}, 'list': [10, 20], 'name': 'bar'}
+
+    assert Predicate('a.b == 1')(node)
+    assert Predicate("a['b'] == 1")(node)
+    assert Predicate('list[1] == 20')(node)
+    assert Predicate('missing is None')(node)
+    assert Predicate('a.missing.deeper is None')(node)
+    assert not Predicate('list[5] == 20')(node)
+
+
+def test_operators():
+    node = {'id': 3, 'name': 'bar', 'tags': ['x']}
+
+    assert Predicate("id >= 2 and match(name, '^ba')")(node)
+    assert Predicate('id < 2 or not id > 5')(node)
+    assert Predicate("'x' in tags and 'y' not in tags")(node)
+    assert Predicate('1 < id < 5')(node)
+    assert Predicate('id in [1, 3]')(node)
+    assert Predicate('-id == -3')(node)
+
+
+def test_type_mismatches_are_false():
+    assert not Predicate("id > 'a'")({'id': 3})
+    assert not Predicate('missing > 1')({})
+    assert not Predicate("match(id, 'x')")({'id': 3})
+
+
+def test_functions():
+    node = {'name': 'Bar', 'count': '12', 'tags': {'a': 1}}
+
+    assert Predicate("lower(name) == 'bar' and upper(name) == 'BAR'")(node)
+    assert Predicate('int(count) == 12 and float(count) == 12.0')(node)
+    assert Predicate('len(tags) == 1 and exists(tags.a) and not exists(tags.b)')(node)
+    assert Predicate("str(len(name)) == '3'")(node)
+    assert Predicate('int(name) is None')(node)
+
+
+@pytest.mark.parametrize('expression', [
+    'id >', '__import__("os")', 'name.upper()', 'len(x=1)', 'a + 1', 'lambda: 1', 'a if b else c', 'a[b] == 1'])
+def test_unsupported_expressions(expression):
+    with pytest.raises(PredicateError):
+        Predicate(expression)
+
+
+def test_queries():
+    assert Predicate("id == 2 and match(name, 'x')").query == {'orderBy': 'id', 'equalTo': 2}
+    assert Predicate('2 < id and id <= 5').query == {'orderBy': 'id', 'startAt': 2, 'endAt': 5}
+    assert Predicate('a.b >= 1 and c == 1').query == {'orderBy': 'a/b', 'startAt': 1}
+    assert Predicate('id == 1 or id == 2').query is None
+    assert Predicate('list[0] == 1').query is None
+
+
+def test_bools_are_not_numbers():
+    assert not Predicate('id == 1')({'id': True})
+    assert Predicate('id != 1')({'id': True})
+    assert not Predicate('id >= 1')({'id': True})
+    assert not Predicate('id < 1')({'id': False})
+    assert not Predicate('id in [1, 2]')({'id': True})
+    assert Predicate('id == True')({'id': True})
+    assert Predicate('id == 1.0')({'id': 1})
+
+
+@pytest.mark.parametrize('expression', ['id == 1', 'id >= 1', 'id <= 1', 'id > 0 and id < 2', 'id == True'])
+def test_query_and_filter_agree(firebase, expression):
+    data = {'k': dict(('n%d' % i, {'id': value}) for i, value in enumerate(
+        [True, False, 0, 1, 1.0, 2, '1', None, 'a', {'x': 1}]))}
+
+    def matches(indexes):
+        fake, root = firebase(data, indexes=indexes)
+        return sorted(result[0] for result in list_values(root, 'k/(.*)', test_eval=expression))
+
+    with_index = matches(['id'])
+    assert with_index == matches([])
+    assert with_index
@@ -0,0 +1,37 @@
+# coding=utf-8
+from firetool_commands.retry import RetryPolicy
+
+
+def test_budget_is_spent_by_retries():
+    policy = RetryPolicy(base_delay=0, budget=3)
+
+    for attempt in range(1, 4):
+        assert policy.should_retry(attempt)
+        policy.backoff(attempt)
+
+    assert not policy.should_retry(1)
+    assert policy.retries == 3
+
+
+def test_successes_refill_the_budget():
+    policy = RetryPolicy(base_delay=0, budget=2, budget_refill=0.5)
+    policy.backoff(1)
+    policy.backoff(1)
+
+    policy.record_success()
+    assert not policy.should_retry(1)
+
+    policy.record_success()
+    assert policy.should_retry(1)
+
+    # never more than the budget
+    for _ in range(100):
+        policy.record_success()
+    assert policy.tokens == 2
+
+
+def test_attempts_are_limited_per_request():
+    policy = RetryPolicy(max_attempts=3)
+
+    assert policy.should_retry(2)
+    assert not policy.should_retry(3)
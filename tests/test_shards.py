@@ -0,0 +1,66 @@
+# coding=utf-8
+import gzip
+import os
+
+import gevent
+import pytest
+
+from firetool_commands.operations import export_values
+from firetool_commands.shards import NdjsonShardWriter, read_shard
+
+
+def test_export_round_trip_through_gzip_shards(firebase, tmpdir):
+    tree = dict(('k%03d' % i, {'name': 'node %d' % i, 'tags': {'even': i % 2 == 0}}) for i in range(100))
+    fake, root = firebase({'a': tree})
+
+    writer = NdjsonShardWriter(str(tmpdir.join('backup')), compression='gzip', max_shard_bytes=1000, chunk_bytes=200)
+    for path, value in export_values(root, 'a/(.*)'):
+        writer.write(path, value)
+    writer.close()
+
+    assert len(writer.shards) > 1
+    assert writer.lines == 100
+    assert all(shard.endswith('.ndjson.gz') for shard in writer.shards)
+
+    # Every shard is a complete gzip file
+    for shard in writer.shards:
+        with gzip.open(shard, 'rb') as f:
+            assert f.read().endswith(b'\n')
+
+    records = [(path, value) for shard in writer.shards for _, _, path, value in read_shard(shard)]
+    assert dict(records) == dict(('a/' + key, value) for key, value in tree.items())
+    assert len(records) == 100
+
+
+def test_shards_rotate_after_max_shard_bytes(tmpdir):
+    writer = NdjsonShardWriter(str(tmpdir.join('backup')), max_shard_bytes=100, chunk_bytes=1)
+    for i in range(10):
+        writer.write('a/%d' % i, 'x' * 40)
+    writer.close()
+
+    sizes = [os.path.getsize(shard) for shard in writer.shards]
+    # A shard is closed once it reaches the limit, a chunk is never split
+    assert all(size < 100 + 60 for size in sizes)
+    assert sum(sizes) == writer.bytes
+    assert [os.path.basename(shard) for shard in writer.shards][:2] == ['backup-00000.ndjson', 'backup-00001.ndjson']
+
+
+def test_writer_errors_reach_close(tmpdir):
+    writer = NdjsonShardWriter(str(tmpdir.join('missing', 'backup')))
+    writer.write('a', 1)
+
+    with pytest.raises(IOError):
+        writer.close()
+
+
+def test_writer_errors_reach_write(tmpdir):
+    writer = NdjsonShardWriter(str(tmpdir.join('missing', 'backup')), chunk_bytes=1)
+    writer.write('a', 1)
+
+    with pytest.raises(IOError):
+        for i in range(100):
+            gevent.sleep(0.01)
+            writer.write('a', i)
+
+    with pytest.raises(IOError):
+        writer.close()
@@ -0,0 +1,61 @@
+# coding=utf-8
+import pytest
+
+from firetool_commands.stats import LatencyHistogram, RunStats, format_bytes, format_seconds
+
+# Buckets are 2^(1/4) wide, a percentile is the upper bound of its bucket
+BUCKET_WIDTH = 2 ** 0.25
+
+
+@pytest.mark.parametrize('p, exact', [(50, 0.050), (95, 0.095), (99, 0.099)])
+def test_percentiles(p, exact):
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000.0)
+
+    assert exact <= histogram.percentile(p) < exact * BUCKET_WIDTH
+
+
+def test_percentile_never_exceeds_the_max():
+    histogram = LatencyHistogram()
+    histogram.add(0.0001)
+    histogram.add(0.3)
+
+    assert histogram.percentile(50) == pytest.approx(0.0005)
+    assert histogram.percentile(100) == 0.3
+    assert histogram.max == 0.3
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+
+    assert histogram.percentile(50) is None
+    assert histogram.count == 0
+
+
+def test_errors_are_keyed_by_status_and_exception():
+    stats = RunStats()
+    stats.record('GET', 0.01, bytes_in=10, status=200)
+    stats.record('GET', 0.02, bytes_in=5, status=503)
+    stats.record('GET', 0.02, status=503)
+    stats.record('GET', 0.5, error='ReadTimeout')
+    stats.record('PATCH', 0.01, bytes_out=7, status=400)
+
+    get = stats.to_dict()['methods']['GET']
+    assert get['requests'] == 4
+    assert get['errors'] == {'503': 2, 'ReadTimeout': 1}
+    assert get['bytes_in'] == 15
+    assert get['latency_max'] == 0.5
+
+    patch = stats.to_dict()['methods']['PATCH']
+    assert patch['errors'] == {'400': 1}
+    assert patch['bytes_out'] == 7
+
+
+def test_format():
+    assert format_bytes(512) == '512B'
+    assert format_bytes(1536) == '1.5KB'
+    assert format_bytes(3 * 1024 ** 4) == '3072.0GB'
+    assert format_seconds(None) == '-'
+    assert format_seconds(0.0123) == '12ms'
+    assert format_seconds(2.34) == '2.3s'
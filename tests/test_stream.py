@@ -0,0 +1,72 @@
+# coding=utf-8
+import requests
+
+from firetool_commands.retry import RetryPolicy
+from firetool_commands.watch import parse_event_stream, apply_event, watch_node
+
+
+class StubCredentials(object):
+    class Token(object):
+        access_token = 'secret'
+
+    def get_access_token(self):
+        return self.Token()
+
+
+def test_token_goes_in_a_header(firebase):
+    fake, root = firebase({'a': {'b': 1, 'c': 2}})
+    root._credentials = StubCredentials()
+
+    assert root.stream_headers() == {'Authorization': 'Bearer secret'}
+    assert dict(root.iterate_children('a')) == {'b': 1, 'c': 2}
+
+
+def test_parse_event_stream_across_chunks():
+    chunks = [b'event: put\ndata: {"path": "/", ', b'"data": 1}\n\n:comment\n', b'event: keep-alive\ndata: null\n\n']
+
+    assert list(parse_event_stream(chunks)) == [('put', '{"path": "/", "data": 1}'), ('keep-alive', 'null')]
+
+
+def test_apply_event():
+    tree = apply_event(None, 'put', '/', {'a': {'b': 1}})
+    tree = apply_event(tree, 'patch', '/a', {'c': 2, 'b': None})
+    tree = apply_event(tree, 'put', '/d/e', 3)
+
+    assert tree == {'a': {'c': 2}, 'd': {'e': 3}}
+    assert apply_event(tree, 'put', '/', None) is None
+
+
+class ReconnectingRoot(object):
+    """Fails to open the stream a few times, then sends a cancel event."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.retry_policy = RetryPolicy(base_delay=0, budget=1)
+
+    def stream(self, path, timeout=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise requests.exceptions.ConnectionError('reset')
+
+        return StubResponse([b'event: cancel\ndata: "gone"\n\n'])
+
+
+class StubResponse(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+
+def test_watch_reconnects_without_spending_the_retry_budget():
+    root = ReconnectingRoot(failures=5)
+    events = []
+
+    watch_node(root, 'a', lambda *event: events.append(event))
+
+    assert events == [('cancel', 'a', '"gone"')]
+    assert root.retry_policy.should_retry(1)
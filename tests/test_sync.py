@@ -0,0 +1,35 @@
+# coding=utf-8
+from firetool_commands.operations import sync_values, mirrors_children
+
+
+def test_sync_deletes_extraneous_children(firebase):
+    fake, root = firebase({'src': {'a': {'x': 1}, 'b': {'x': 5}}, 'dst': {'a': {'x': 2}, 'c': {'x': 9}}})
+
+    list(sync_values(root, 'src/(.*)', r'dst/\1'))
+
+    assert fake.data['dst'] == {'a': {'x': 1}, 'b': {'x': 5}}
+
+
+def test_sync_keeps_children_filtered_out_by_test_eval(firebase):
+    fake, root = firebase({'src': {'a': {'x': 1}, 'b': {'x': 5}}, 'dst': {'a': {'x': 1}, 'c': {'x': 9}}})
+
+    list(sync_values(root, 'src/(.*)', r'dst/\1', test_eval='x > 2'))
+
+    assert fake.data['dst'] == {'a': {'x': 1}, 'b': {'x': 5}}
+
+
+def test_sync_keeps_siblings_of_a_literal_suffix(firebase):
+    fake, root = firebase({'src': {'a': {'x': 1}}, 'dst': {'a': {'data': {'x': 0}, 'meta': {'owner': 'me'}}}})
+
+    list(sync_values(root, 'src/(.*)', r'dst/\1/data'))
+
+    assert fake.data['dst'] == {'a': {'data': {'x': 1}, 'meta': {'owner': 'me'}}}
+
+
+def test_mirrors_children():
+    assert mirrors_children('src/(.*)', r'dst/\1')
+    assert mirrors_children('src/(.*)/items/(.*)', r'dst/\1/\2')
+    assert not mirrors_children('src/(.*)/items/(.*)', r'dst/\2/\1')
+    assert not mirrors_children('src/(.*)', r'dst/\1/data')
+    assert not mirrors_children('src/(.*)/data', r'dst/\1')
+    assert not mirrors_children('src/{a,b}', 'dst/a')